@@ -3,11 +3,7 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from . models import CustomUser
 from django.shortcuts import render,redirect, reverse
-from myapp.models import Product,  SaleItem, Stock
-from datetime import date, timedelta
-from django.db.models import Sum
-from django.utils.timezone import now
-today = now().date()
+from myapp.dashboard import dashboard_metrics
 
 
 
@@ -48,29 +44,9 @@ def admin_view(request):
     company_name = current_user.company.company_name
     company = current_user.company
 
-    today = now().date()
-    # Aggregate total quantity and total revenue from SaleItem
-    today_sales = SaleItem.objects.filter(sale__created_at__date=today, company=company).aggregate(
-        total_quantity=Sum('quantity'),
-        total_revenue=Sum('total_price')
-    )
-    low_stock_count = sum(1 for p in Product.objects.filter(company=company) if p.low_stock)
-    products_count = Product.objects.filter(company=company).count()
-    today = date.today()
-    near_expiry_limit = today + timedelta(days=90)
-
-    expired_count = Stock.objects.filter(expiry_date__lt=today, company=company).count()
-    near_expiry_count = Stock.objects.filter(expiry_date__range=[today, near_expiry_limit], company=company).count()
-    near_expiry = Stock.objects.filter(expiry_date__range=[today, near_expiry_limit], company=company)
     context = {
         "company_name":company_name,
-        "expired_count":expired_count,
-        'near_expiry':near_expiry,
-        'near_expiry_count':near_expiry_count,
-        "low_stock_count":low_stock_count,
-        'products': products_count,
-        'today_total_quantity': today_sales['total_quantity'] or 0,
-        'today_sales_birr': today_sales['total_revenue'] or 0,
+        **dashboard_metrics(company),
     }
 
     return render(request, 'admin_page.html', context)
@@ -80,30 +56,10 @@ def admin_view(request):
 @user_passes_test(is_cashier)
 def cashier_view(request):
     current_user = request.user
-    company = current_user.company    
-    today = now().date()
-    current_user = request.user
-    # Aggregate total quantity and total revenue from SaleItem
-    today_sales = SaleItem.objects.filter(sale__created_at__date=today, sale__sold_by = current_user, company=company).aggregate(
-        total_quantity=Sum('quantity'),
-        total_revenue=Sum('total_price')
-    )
-    low_stock_count = sum(1 for p in Product.objects.filter(company=company) if p.low_stock)
-    products_count = Product.objects.filter(company=company).count()
-    today = date.today()
-    near_expiry_limit = today + timedelta(days=90)
-    expired_count = Stock.objects.filter(expiry_date__lt=today, company=company).count()
-    near_expiry_count = Stock.objects.filter(expiry_date__range=[today, near_expiry_limit], company=company).count()
-    near_expiry = Stock.objects.filter(expiry_date__range=[today, near_expiry_limit], company=company)
+    company = current_user.company
     context = {
         'company':company,
-        "expired_count":expired_count,
-        'near_expiry':near_expiry,
-        'near_expiry_count':near_expiry_count,
-        "low_stock_count":low_stock_count,
-        'products': products_count,
-        'today_total_quantity': today_sales['total_quantity'] or 0,
-        'today_sales_birr': today_sales['total_revenue'] or 0,
+        **dashboard_metrics(company, cashier=current_user),
     }
 
     return render(request, 'cashier_page/cashier_page.html', context)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, Stock, Sale, DailySummary, SaleItem
+from .models import Category, Product, Stock, Sale, DailySummary, SaleItem, ProductSalesHour, ExpiryPolicy, ExpiryBucket, Job
 from django.db.models import Sum
 
 @admin.register(Category)
@@ -24,6 +24,12 @@ class StockAdmin(admin.ModelAdmin):
 class DailySummaryAdmin(admin.ModelAdmin):
     list_display = ('date', 'company','total_sales', 'total_items_sold')
     ordering = ('-date',)
+
+@admin.register(ProductSalesHour)
+class ProductSalesHourAdmin(admin.ModelAdmin):
+    list_display = ('hour', 'product', 'company', 'quantity', 'revenue', 'cost')
+    list_filter = ('company',)
+    ordering = ('-hour',)
 class SaleItemInline(admin.TabularInline):
     model = SaleItem
     extra = 1
@@ -36,4 +42,20 @@ class SaleAdmin(admin.ModelAdmin):
 
     def total_quantity(self, obj):
         return obj.items.aggregate(total=Sum('quantity'))['total'] or 0
-    total_quantity.short_description = "Total Quantity"
\ No newline at end of file
+    total_quantity.short_description = "Total Quantity"
+
+@admin.register(ExpiryPolicy)
+class ExpiryPolicyAdmin(admin.ModelAdmin):
+    list_display = ('company', 'critical_days', 'warning_days', 'watch_days')
+
+
+@admin.register(ExpiryBucket)
+class ExpiryBucketAdmin(admin.ModelAdmin):
+    list_display = ('company', 'bucket', 'max_days', 'batches', 'units', 'stock_value', 'computed_on')
+    list_filter = ('company', 'bucket')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'next_run_at', 'locked_by', 'last_finished_at', 'failures')
+    readonly_fields = ('locked_by', 'locked_until', 'last_started_at', 'last_finished_at', 'last_result', 'last_error', 'failures')
@@ -0,0 +1,184 @@
+"""
+Read-only JSON endpoints, written as native async views.
+
+Under ASGI (see myproject/asgi.py) they run on the event loop and use the
+async ORM and cache APIs, so a burst of till searches and dashboard polls
+does not tie up a worker thread per request. Under WSGI Django runs them
+through async_to_sync and they behave like the sync views they replace.
+"""
+import asyncio
+import hashlib
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Sum
+from django.http import (
+    HttpResponse, HttpResponseForbidden, HttpResponseNotModified, JsonResponse, StreamingHttpResponse,
+)
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
+
+from authentication.views import is_admin, is_cashier
+from . import live
+from .catalog import asearch_catalog
+from .dashboard import adashboard_metrics
+from .models import Product, Stock
+
+
+def _resolve_user(request):
+    # Touching request.user loads the session and the user row: sync ORM work
+    return request.user if request.user.is_authenticated else None
+
+
+def async_login_required(view):
+    """login_required for async views; the user ends up in request.auth_user."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await sync_to_async(_resolve_user)(request)
+        if user is None:
+            return redirect_to_login(request.get_full_path(), '/accounts/login')
+        request.auth_user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@async_login_required
+async def product_search(request):
+    data = await asearch_catalog(request.auth_user.company_id, request.GET.get("q", ""))
+    return JsonResponse(data, safe=False)
+
+
+@async_login_required
+async def product_by_barcode(request, barcode):
+    """Exact barcode lookup for scanners: one (company, barcode) unique index hit."""
+    product = await (
+        Product.objects.filter(company_id=request.auth_user.company_id, barcode=barcode.strip())
+        .values('id', 'name', 'barcode', 'category__name', 'selling_price', 'stock_on_hand')
+        .afirst()
+    )
+    if product is None:
+        return JsonResponse({"error": "Product not found."}, status=404)
+
+    data = {
+        "id": product['id'],
+        "name": product['name'],
+        "barcode": product['barcode'],
+        "category": product['category__name'] or "",
+        "selling_price": product['selling_price'],
+        "quantity": product['stock_on_hand'],
+    }
+    response = JsonResponse(data)
+    etag = quote_etag(hashlib.md5(response.content).hexdigest())
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=settings.BARCODE_LOOKUP_MAX_AGE)
+    return response
+
+
+@async_login_required
+async def stock_levels(request):
+    """
+    On-hand quantities of the products in `ids` (comma separated), summed
+    from their batches in one grouped query, so a till can revalidate its
+    whole basket before submitting it. Ids without stock report 0.
+    """
+    try:
+        ids = {int(pid) for pid in request.GET.get('ids', '').split(',') if pid.strip()}
+    except ValueError:
+        return JsonResponse({"error": "ids must be comma-separated product ids."}, status=400)
+    if len(ids) > settings.STOCK_LEVELS_MAX_IDS:
+        return JsonResponse({"error": f"At most {settings.STOCK_LEVELS_MAX_IDS} ids per request."}, status=400)
+
+    levels = dict.fromkeys(ids, 0)
+    rows = (
+        Stock.objects.filter(company_id=request.auth_user.company_id, product_id__in=ids, quantity__gt=0)
+        .order_by().values('product_id')
+        .annotate(on_hand=Sum('quantity'))
+    )
+    async for row in rows:
+        levels[row['product_id']] = row['on_hand']
+    response = JsonResponse({str(pid): on_hand for pid, on_hand in levels.items()})
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+@async_login_required
+async def dashboard_metrics(request):
+    """The dashboard tiles as JSON; a cashier gets their own sales figures."""
+    user = request.auth_user
+    cashier_id = user.pk if is_cashier(user) else None
+    metrics = await adashboard_metrics(user.company_id, cashier_id)
+    return JsonResponse(metrics, encoder=DjangoJSONEncoder)
+
+
+@async_login_required
+async def product_batches(request, product_id):
+    """Stock batches of one product, newest first (admin only)."""
+    user = request.auth_user
+    if not is_admin(user):
+        return HttpResponseForbidden()
+    product = await Product.objects.filter(id=product_id, company_id=user.company_id).values('id', 'name').afirst()
+    if product is None:
+        return JsonResponse({"error": "Product not found."}, status=404)
+
+    batches = [
+        batch async for batch in Stock.objects.filter(product_id=product_id).order_by('-added_at').values(
+            'id', 'batch_number', 'quantity', 'buying_price', 'expiry_date', 'added_at'
+        )
+    ]
+    return JsonResponse({**product, "batches": batches}, encoder=DjangoJSONEncoder)
+
+
+async def dashboard_stream(request):
+    """
+    Server-Sent Events feed for the admin dashboard (ASGI only): a `snapshot`
+    of every tile, then `delta` events for committed sales and `inventory`
+    events for stock changes and for sales that empty a dated batch. The
+    stream ends after DASHBOARD_STREAM_SECONDS and the browser reconnects,
+    which also resyncs the tiles at midnight.
+    """
+    if 'wsgi.version' in request.META:
+        # A WSGI worker would buffer the whole stream; 204 tells EventSource not to retry
+        return HttpResponse(status=204)
+    user = await sync_to_async(_resolve_user)(request)
+    if user is None or not is_admin(user):
+        return HttpResponseForbidden()
+    company_id = user.company_id
+
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+    async def stream():
+        # Subscribe before taking the snapshot, so no sale committing in between is lost.
+        # Events that arrive while the snapshot is read may or may not be in it: drop
+        # them and read it again until it was taken with nothing pending.
+        queue = live.subscribe(company_id)
+        try:
+            while True:
+                snapshot = await adashboard_metrics(company_id)
+                if queue.empty():
+                    break
+                while not queue.empty():
+                    queue.get_nowait()
+            yield event('snapshot', snapshot)
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.DASHBOARD_STREAM_SECONDS
+            while loop.time() < deadline:
+                try:
+                    name, data = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield event(name, data)
+        finally:
+            live.unsubscribe(company_id, queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,122 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Product, normalize_name
+
+
+def _version_key(company_id):
+    return f"catalog-version:{company_id}"
+
+
+async def acatalog_version(company_id):
+    version = await cache.aget(_version_key(company_id))
+    if version is None:
+        await cache.aadd(_version_key(company_id), 1, timeout=None)
+        version = await cache.aget(_version_key(company_id), 1)
+    return version
+
+
+def bump_catalog_version(company_id):
+    """Invalidate the cached catalog of one company; call after any catalog write."""
+    try:
+        cache.incr(_version_key(company_id))
+    except ValueError:
+        cache.add(_version_key(company_id), 2, timeout=None)
+
+
+def _catalog_queryset(company_id):
+    return Product.objects.filter(company_id=company_id).select_related('category').order_by('search_name')
+
+
+def _catalog_row(p):
+    return {
+        "id": p.id,
+        "name": p.name,
+        "search_name": p.search_name,
+        "barcode": p.barcode,
+        "category": p.category.name if p.category else "",
+        "selling_price": p.selling_price,
+    }
+
+
+# company_id -> (version, loaded_at, snapshot). The parsed snapshot stays in
+# this process, so a keystroke neither unpickles the catalog nor depends on the
+# shared cache accepting a value of its size; only the version is shared.
+_snapshots = {}
+
+
+def _cached_snapshot(company_id, version):
+    entry = _snapshots.get(company_id)
+    if entry is None or entry[0] != version:
+        return None
+    # Bounds staleness when the version lives in a per-process cache
+    if time.monotonic() - entry[1] > getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300):
+        return None
+    return entry[2]
+
+
+async def acatalog_snapshot(company_id):
+    """
+    The company's catalog (name, barcode, category, price) as plain dicts,
+    kept in process memory under the current catalog version. Stock
+    quantities are not part of the snapshot, they change with every sale.
+    """
+    version = await acatalog_version(company_id)
+    snapshot = _cached_snapshot(company_id, version)
+    if snapshot is None:
+        snapshot = [_catalog_row(p) async for p in _catalog_queryset(company_id)]
+        _snapshots[company_id] = (version, time.monotonic(), snapshot)
+    return snapshot
+
+
+def _rank(snapshot, q, limit):
+    """Exact barcode hits, then name prefix hits, then substring hits, capped to `limit`."""
+    results = [row for row in snapshot if row["barcode"] == q][:limit]
+    if results:
+        return results
+
+    needle = normalize_name(q)
+    prefix = [row for row in snapshot if row["search_name"].startswith(needle)][:limit]
+    seen = {row["id"] for row in prefix}
+    lowered = q.lower()
+    substring = []
+    if len(prefix) < limit:
+        for row in snapshot:
+            if row["id"] in seen:
+                continue
+            if (needle in row["search_name"] or lowered in (row["barcode"] or "").lower()
+                    or lowered in row["category"].lower()):
+                substring.append(row)
+                if len(prefix) + len(substring) >= limit:
+                    break
+    return prefix + substring
+
+
+def _with_quantities(results, quantities):
+    return [
+        {**{k: v for k, v in row.items() if k != "search_name"}, "quantity": quantities.get(row["id"], 0)}
+        for row in results
+    ]
+
+
+async def asearch_catalog(company_id, q, limit=None):
+    """
+    Ranked product lookup over the in-memory snapshot: exact barcode hits,
+    then name prefix hits, then substring hits, capped to the top-K. Only
+    the live on-hand quantities of the returned rows are read from the
+    database.
+    """
+    q = (q or "").strip()
+    if not q:
+        return []
+    snapshot = await acatalog_snapshot(company_id)
+    results = _rank(snapshot, q, limit or getattr(settings, 'PRODUCT_SEARCH_LIMIT', 20))
+    quantities = {
+        pk: quantity
+        async for pk, quantity in Product.objects.filter(
+            id__in=[row["id"] for row in results]
+        ).values_list('id', 'stock_on_hand')
+    }
+    return _with_quantities(results, quantities)
@@ -0,0 +1,140 @@
+"""
+Bulk catalog import: products (and their categories) from a CSV, upserted on
+(company, barcode) in batches instead of one ProductForm save per row.
+"""
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, connection, transaction
+
+from .catalog import bump_catalog_version
+from .dashboard import bump_dashboard_version
+from .models import Category, Product, normalize_name
+
+# Product fields an import overwrites on an existing (company, barcode) row
+UPDATE_FIELDS = ['name', 'search_name', 'category', 'selling_price', 'low_stock_threshold']
+
+# Checked per row: an out-of-range value would fail the whole batch INSERT
+MAX_LOW_STOCK_THRESHOLD = 1_000_000
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.categories_created = 0
+        self.errors = []  # (line number, message)
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+
+def _parse_row(row):
+    """(name, category, barcode, selling_price, low_stock_threshold) of one CSV row, or raise ValueError."""
+    name = " ".join((row.get('name') or '').split())
+    if not name or len(name) > 200:
+        raise ValueError("name is required (at most 200 characters).")
+    barcode = (row.get('barcode') or '').strip()
+    if not barcode or len(barcode) > 100:
+        raise ValueError("barcode is required (at most 100 characters), products are matched on it.")
+    try:
+        selling_price = Decimal((row.get('selling_price') or '').strip())
+        # NaN survives quantize() and then raises on comparison
+        if not selling_price.is_finite():
+            raise InvalidOperation
+        selling_price = selling_price.quantize(Decimal('0.01'))
+        in_range = 0 < selling_price < 10 ** 8
+    except InvalidOperation:
+        raise ValueError(f"invalid selling_price {row.get('selling_price')!r}.")
+    if not in_range:
+        raise ValueError("selling_price must be positive and below 100,000,000.")
+    threshold = (row.get('low_stock_threshold') or '').strip()
+    if threshold and not threshold.isdecimal():
+        raise ValueError(f"invalid low_stock_threshold {threshold!r}.")
+    if threshold and int(threshold) > MAX_LOW_STOCK_THRESHOLD:
+        raise ValueError(f"low_stock_threshold must be at most {MAX_LOW_STOCK_THRESHOLD:,}.")
+    category = " ".join((row.get('category') or '').split())
+    if len(category) > 100:
+        raise ValueError("category must be at most 100 characters.")
+    return name, category, barcode, selling_price, int(threshold) if threshold else None
+
+
+def _resolve_categories(company, names, categories, result):
+    """Fill `categories` ({name: id}) for `names`, creating the missing ones with one INSERT."""
+    missing = {name for name in names if name and name not in categories}
+    if not missing:
+        return
+    existing = dict(Category.objects.filter(company=company, name__in=missing).values_list('name', 'id'))
+    new = [Category(company=company, name=name) for name in missing - existing.keys()]
+    if new:
+        try:
+            with transaction.atomic():
+                Category.objects.bulk_create(new)
+            result.categories_created += len(new)
+        except IntegrityError:
+            # Another import created some of them meanwhile: count only ours
+            for category in new:
+                _, created = Category.objects.get_or_create(company=company, name=category.name)
+                result.categories_created += created
+        existing.update(
+            Category.objects.filter(company=company, name__in=[c.name for c in new]).values_list('name', 'id')
+        )
+    categories.update(existing)
+
+
+def _flush(company, batch, categories, result):
+    _resolve_categories(company, {category for _, category, *_ in batch.values()}, categories, result)
+    products = [
+        Product(
+            company=company,
+            name=name,
+            search_name=normalize_name(name),
+            category_id=categories.get(category),
+            barcode=barcode,
+            selling_price=selling_price,
+            low_stock_threshold=10 if threshold is None else threshold,
+        )
+        for name, category, barcode, selling_price, threshold in batch.values()
+    ]
+    # MySQL upserts on any unique key (ON DUPLICATE KEY UPDATE) and rejects unique_fields
+    unique_fields = ['company', 'barcode'] if connection.features.supports_update_conflicts_with_target else None
+    with transaction.atomic():
+        Product.objects.bulk_create(
+            products, update_conflicts=True, unique_fields=unique_fields, update_fields=UPDATE_FIELDS,
+        )
+    result.imported += len(products)
+
+
+def import_catalog(company, rows, batch_size=1000):
+    """
+    Upsert the products of `rows` (dicts with name, category, barcode,
+    selling_price and optional low_stock_threshold, e.g. a csv.DictReader)
+    into `company`'s catalog, `batch_size` rows per INSERT. Rows are read
+    lazily, so a large file is never held in memory. Bad rows are skipped
+    and reported in the result; the rest are imported.
+    """
+    result = ImportResult()
+    categories = {}
+    batch = {}  # barcode -> parsed row: a later row for the same barcode wins
+    line = 1  # the header
+    try:
+        for line, row in enumerate(rows, start=2):
+            row = {(key or '').strip().lower(): value for key, value in row.items()}
+            try:
+                parsed = _parse_row(row)
+            except ValueError as e:
+                result.error(line, str(e))
+                continue
+            batch[parsed[2]] = parsed
+            if len(batch) >= batch_size:
+                _flush(company, batch, categories, result)
+                batch = {}
+        if batch:
+            _flush(company, batch, categories, result)
+    except (csv.Error, UnicodeDecodeError) as e:
+        result.error(line, f"unreadable CSV ({e}); nothing after this line was imported.")
+    finally:
+        if result.imported:
+            # bulk_create fires no post_save signals
+            bump_catalog_version(company.pk)
+            bump_dashboard_version(company.pk)
+    return result
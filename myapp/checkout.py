@@ -0,0 +1,368 @@
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Product, Stock, Sale, SaleItem
+from .dashboard import bump_dashboard_version
+from .expiry import expiry_counts, expiry_summary, invalidate_expiry_buckets
+from .live import has_subscribers, publish
+from .rollups import record_daily_sale, record_hourly_sales
+
+
+def parse_basket(company, product_ids, quantities):
+    """
+    Turn the posted `product_id[]` / `quantity[]` lists into (product, qty) lines.
+    Raises ValidationError listing every problem found in the basket.
+
+    The stock check here is only a cheap early rejection against the on-hand
+    counter; allocate_fifo() revalidates against the locked batches.
+    """
+    if not product_ids or not quantities:
+        raise ValidationError("No products selected.")
+
+    try:
+        quantities = [int(q) for q in quantities]
+    except (ValueError, TypeError):
+        raise ValidationError("Invalid quantity entered.")
+
+    # A non-numeric id would make the id__in lookup raise; it is reported as not found below
+    known_ids = [pid for pid in product_ids if pid.isdigit()]
+    product_map = {
+        str(p.id): p for p in Product.objects.filter(id__in=known_ids, company=company)
+    }
+    lines, errors = [], []
+    requested = defaultdict(int)
+    for pid, qty in zip(product_ids, quantities):
+        product = product_map.get(pid)
+        if not product:
+            errors.append(f"Product with ID {pid} not found.")
+        elif qty <= 0:
+            errors.append(f"Quantity for {product.name} must be at least 1.")
+        else:
+            lines.append((product, qty))
+            requested[product.id] += qty
+
+    for product in product_map.values():
+        if requested[product.id] > product.total_stock:
+            errors.append(f"Not enough stock for {product.name}. Available: {product.total_stock}")
+
+    if errors:
+        raise ValidationError(errors)
+    return lines
+
+
+def fifo_batches(product_ids):
+    """Batches of `product_ids` with stock left, oldest first per product (stock_fifo_idx)."""
+    return Stock.objects.filter(product_id__in=product_ids, quantity__gt=0).order_by('product_id', 'added_at', 'id')
+
+
+def allocate_fifo(lines):
+    """
+    Deduct every line of the basket from its oldest batches first.
+
+    All candidate batches are read and locked in one query, split in memory
+    and written back with a single bulk_update, so the number of queries does
+    not grow with the size of the basket. Must run inside a transaction: the
+    row locks make a concurrent checkout of the same products wait until this
+    one commits, and the availability check below uses the locked quantities.
+
+    Returns the FIFO buying cost of each line, in basket order, and the
+    {product_id: (on_hand_before, on_hand_after)} levels of the locked batches.
+    """
+    product_ids = {product.id for product, _ in lines}
+    batches = defaultdict(list)
+    for batch in fifo_batches(product_ids).select_for_update(skip_locked=False):
+        batches[batch.product_id].append(batch)
+
+    touched, deducted, costs, errors = {}, defaultdict(int), [], []
+    for product, qty in lines:
+        remaining, cost = qty, 0
+        for batch in batches[product.id]:
+            if remaining == 0:
+                break
+            take = min(batch.quantity, remaining)
+            if take:
+                batch.quantity -= take
+                remaining -= take
+                cost += take * batch.buying_price
+                touched[batch.pk] = batch
+        costs.append(cost)
+        if remaining:
+            available = qty - remaining
+            errors.append(f"Not enough stock for {product.name}. Available: {available}")
+        deducted[product.id] += qty - remaining
+
+    if errors:
+        raise ValidationError(errors)
+
+    levels = {}
+    for product_id, product_batches in batches.items():
+        after = sum(batch.quantity for batch in product_batches)
+        levels[product_id] = (after + deducted[product_id], after)
+
+    Stock.objects.bulk_update(touched.values(), ['quantity'])
+    # The expiry buckets count units and value of dated batches, so any deduction from one changes them
+    dated = [batch for batch in touched.values() if batch.expiry_date]
+    for company_id in {batch.company_id for batch in dated}:
+        transaction.on_commit(lambda company_id=company_id: invalidate_expiry_buckets(company_id))
+    # bulk_update fires no Stock signals: a dated batch sold out leaves the expired or
+    # near-expiry tiles, so push their recomputed counts (after the invalidation above)
+    for company_id in {batch.company_id for batch in dated if batch.quantity == 0}:
+        if has_subscribers(company_id):
+            transaction.on_commit(
+                lambda company_id=company_id: publish(company_id, 'inventory', expiry_counts(expiry_summary(company_id)))
+            )
+    # bulk_update bypasses Stock.save(), so release the on-hand counters here
+    Product.objects.filter(pk__in=deducted).update(
+        stock_on_hand=F('stock_on_hand') - Case(
+            *[When(pk=pid, then=Value(qty)) for pid, qty in deducted.items()],
+            default=Value(0),
+        )
+    )
+    return costs, levels
+
+
+def is_lock_conflict(error):
+    """True for deadlocks and lock wait timeouts, which are safe to retry."""
+    code = error.args[0] if error.args else None
+    # 1205: lock wait timeout, 1213: deadlock (MySQL); SQLite reports "database is locked"
+    return code in (1205, 1213) or 'deadlock' in str(error).lower() or 'locked' in str(error).lower()
+
+
+def _with_retries(func, *args):
+    """
+    Run the transaction `func(*args)`, retrying it with exponential backoff
+    when the database aborts it on a deadlock or lock timeout
+    (CHECKOUT_MAX_RETRIES attempts, starting at CHECKOUT_RETRY_BACKOFF seconds).
+    """
+    max_retries = getattr(settings, 'CHECKOUT_MAX_RETRIES', 3)
+    backoff = getattr(settings, 'CHECKOUT_RETRY_BACKOFF', 0.05)
+
+    for attempt in range(max_retries + 1):
+        try:
+            return func(*args)
+        except OperationalError as e:
+            # Inside an outer transaction the whole unit has to be retried by the caller
+            if attempt == max_retries or connection.in_atomic_block or not is_lock_conflict(e):
+                raise
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def record_sale(company, sold_by, lines, idempotency_key=None):
+    """
+    Create the Sale and its SaleItems for a validated basket, deducting stock
+    FIFO. If a concurrent request has already recorded `idempotency_key`,
+    this one is rolled back and that sale is returned instead.
+    """
+    try:
+        return _with_retries(_record_sale, company, sold_by, lines, idempotency_key)
+    except IntegrityError:
+        if idempotency_key is None:
+            raise
+        with transaction.atomic():
+            # A locking read sees the other request's committed row
+            sale = Sale.objects.select_for_update().filter(company=company, idempotency_key=idempotency_key).first()
+        if sale is None:
+            # Not a duplicate key: some other constraint failed
+            raise
+        return sale
+
+
+def _replayed_sale(company, idempotency_key):
+    if idempotency_key is None:
+        return None
+    return Sale.objects.filter(company=company, idempotency_key=idempotency_key).first()
+
+
+def submit_sale(company, sold_by, product_ids, quantities, idempotency_key=None):
+    """
+    Validate and record a posted sale form once per idempotency key. A replay
+    of a key that was already recorded (a double click, a resubmitted page)
+    returns the original sale without validating or deducting stock again.
+    """
+    if idempotency_key is not None and len(idempotency_key) > 64:
+        raise ValidationError("Invalid idempotency key.")
+    sale = _replayed_sale(company, idempotency_key)
+    if sale:
+        return sale
+    try:
+        lines = parse_basket(company, product_ids, quantities)
+        return record_sale(company, sold_by, lines, idempotency_key)
+    except ValidationError:
+        # The first submission may have sold the stock this one was refused for
+        sale = _replayed_sale(company, idempotency_key)
+        if sale:
+            return sale
+        raise
+
+
+def _record_sale(company, sold_by, lines, idempotency_key=None, sold_at=None):
+    with transaction.atomic():
+        costs, levels = allocate_fifo(lines)
+
+        items = [
+            SaleItem(
+                company=company,
+                product=product,
+                quantity=qty,
+                selling_price=product.selling_price,
+                total_price=qty * product.selling_price,
+                total_cost=cost,
+            )
+            for (product, qty), cost in zip(lines, costs)
+        ]
+        grand_total = sum(item.total_price for item in items)
+
+        sale = Sale.objects.create(
+            total_price=grand_total, company=company, sold_by=sold_by, idempotency_key=idempotency_key,
+        )
+        if sold_at is not None:
+            # created_at is auto_now_add: a sale rung up earlier on an offline till is backdated here
+            Sale.objects.filter(pk=sale.pk).update(created_at=sold_at)
+            sale.created_at = sold_at
+        for item in items:
+            item.sale = sale
+        SaleItem.objects.bulk_create(items)
+
+        # Update daily and hourly rollups
+        sale_day = timezone.localdate(sale.created_at)
+        record_daily_sale(company, sale_day, grand_total, sum(qty for _, qty in lines))
+        record_hourly_sales(company, items, sale.created_at)
+        company_id = company.pk if company else None
+        delta = {
+            'today_sales_birr': grand_total,
+            'today_total_quantity': sum(qty for _, qty in lines),
+            # products this sale pushed to or below their low-stock threshold
+            'low_stock_count': sum(
+                1 for product in {product for product, _ in lines}
+                if levels[product.id][0] > product.low_stock_threshold >= levels[product.id][1]
+            ),
+        }
+        transaction.on_commit(lambda: bump_dashboard_version(company_id))
+        if sale_day == timezone.localdate():
+            transaction.on_commit(lambda: publish(company_id, 'delta', delta))
+
+    return sale
+
+
+def _sold_at(queued_at):
+    """The time a queued sale was rung up, clamped to the last SALE_SYNC_MAX_AGE seconds; None means now."""
+    if queued_at is None:
+        return None
+    try:
+        moment = parse_datetime(queued_at) if isinstance(queued_at, str) else None
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValidationError(f"Invalid queued_at {queued_at!r}, expected an ISO 8601 date and time.")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    now = timezone.now()
+    oldest = now - timedelta(seconds=getattr(settings, 'SALE_SYNC_MAX_AGE', 2 * 24 * 3600))
+    return min(max(moment, oldest), now)
+
+
+def _parse_queued_sale(sale):
+    """(product_ids, quantities, sold_at) of one queued sale, or raise ValidationError."""
+    items = sale.get('items')
+    if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+        raise ValidationError("items must be a non-empty list of {product_id, quantity} objects.")
+    for item in items:
+        # bool is an int subclass; a float quantity would be truncated by parse_basket()
+        if any(type(item.get(field)) is not int for field in ('product_id', 'quantity')):
+            raise ValidationError("product_id and quantity must be whole numbers.")
+    return (
+        [str(item['product_id']) for item in items],
+        [item['quantity'] for item in items],
+        _sold_at(sale.get('queued_at')),
+    )
+
+
+def parse_sale_batch(data):
+    """
+    The sales of a till's sync payload, {"sales": [{"key": ..., "queued_at":
+    ..., "items": [{"product_id": ..., "quantity": ...}, ...]}, ...]}, as
+    (key, product_ids, quantities, sold_at, errors) entries. Only a payload
+    that is not a list of sales raises ValidationError: a malformed sale is
+    returned with its errors and rejected on its own by record_sale_batch().
+    """
+    max_sales = getattr(settings, 'SALE_SYNC_MAX_BATCH', 50)
+    sales = data.get('sales') if isinstance(data, dict) else None
+    if not isinstance(sales, list) or not sales:
+        raise ValidationError('Expected a non-empty "sales" list.')
+    if len(sales) > max_sales:
+        raise ValidationError(f"At most {max_sales} sales per batch.")
+
+    entries = []
+    for sale in sales:
+        sale = sale if isinstance(sale, dict) else {}
+        key = sale.get('key')
+        try:
+            if not isinstance(key, str) or not 0 < len(key) <= 64:
+                raise ValidationError("key must be a string of 1 to 64 characters.")
+            entries.append((key, *_parse_queued_sale(sale), []))
+        except ValidationError as e:
+            entries.append((key, [], [], None, e.messages))
+    return entries
+
+
+def _sale_result(key, status, sale):
+    return {'key': key, 'status': status, 'sale_id': sale.pk, 'total_price': sale.total_price}
+
+
+def record_sale_batch(company, sold_by, entries):
+    """
+    Record the sales a till queued while offline, in one transaction.
+
+    Each sale runs in its own savepoint with the same FIFO deduction as
+    record_sale(): a basket that fails validation is rejected without
+    affecting the others. A key that already has a sale (an earlier flush
+    whose response was lost, or a repeat inside the batch) is not recorded
+    again. A sale is dated at its `queued_at`, so a sale rung up before
+    midnight counts for that day. Returns one {key, status, sale_id,
+    total_price | errors} result per entry, status being "created",
+    "duplicate" or "rejected".
+    """
+    return _with_retries(_record_sale_batch, company, sold_by, entries)
+
+
+def _record_sale_batch(company, sold_by, entries):
+    results = []
+    with transaction.atomic():
+        keys = [key for key, *_, errors in entries if not errors]
+        recorded = {sale.idempotency_key: sale for sale in Sale.objects.filter(company=company, idempotency_key__in=keys)}
+        for key, product_ids, quantities, sold_at, errors in entries:
+            if errors:
+                results.append({'key': key, 'status': 'rejected', 'errors': errors})
+                continue
+            if key in recorded:
+                results.append(_sale_result(key, 'duplicate', recorded[key]))
+                continue
+            try:
+                lines = parse_basket(company, product_ids, quantities)
+                sale = _record_sale(company, sold_by, lines, idempotency_key=key, sold_at=sold_at)
+            except ValidationError as e:
+                results.append({'key': key, 'status': 'rejected', 'errors': e.messages})
+                continue
+            except IntegrityError:
+                # A concurrent flush of the same queue committed this key first; the
+                # savepoint undid our deduction. A locking read sees its committed row.
+                sale = Sale.objects.select_for_update().filter(company=company, idempotency_key=key).first()
+                if sale is None:
+                    # Some other constraint failed: this sale alone is refused
+                    results.append({'key': key, 'status': 'rejected', 'errors': ["The sale could not be recorded."]})
+                    continue
+                recorded[key] = sale
+                results.append(_sale_result(key, 'duplicate', sale))
+                continue
+            recorded[key] = sale
+            results.append(_sale_result(key, 'created', sale))
+    return results
@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from authentication.models import Company
+from .dates import local_day_filter
+from .expiry import aexpiry_summary, expiry_counts, expiry_summary
+from .models import DailySummary, Product, SaleItem
+
+
+def _version_key(company_id):
+    return f"dashboard-version:{company_id}"
+
+
+def bump_dashboard_version(company_id):
+    """Invalidate the cached dashboard tiles of one company (sale or stock write)."""
+    try:
+        cache.incr(_version_key(company_id))
+    except ValueError:
+        cache.add(_version_key(company_id), 2, timeout=None)
+
+
+def _count(queryset, condition=None):
+    """Scalar subquery counting `queryset` rows (optionally only those matching `condition`) per company."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(company=OuterRef('pk')).order_by().values('company')
+            .annotate(n=Count('id', filter=condition)).values('n'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def _inventory_queryset(company_id):
+    return Company.objects.filter(pk=company_id).values(
+        products=_count(Product.objects.all()),
+        low_stock_count=_count(Product.objects.all(), Q(stock_on_hand__lte=F('low_stock_threshold'))),
+    )
+
+
+def inventory_metrics(company_id):
+    """Product and low-stock counts in a single SELECT, expired and near-expiry counts from the expiry buckets."""
+    return {**_inventory_queryset(company_id).get(), **expiry_counts(expiry_summary(company_id))}
+
+
+def _sales_queryset(company_id, cashier_id=None):
+    """Today's units and revenue: the DailySummary row, or the cashier's own lines."""
+    if cashier_id is None:
+        return DailySummary.objects.filter(company_id=company_id, date=timezone.localdate()), {
+            'total_quantity': Sum('total_items_sold'), 'total_revenue': Sum('total_sales'),
+        }
+    today = timezone.localdate()
+    return SaleItem.objects.filter(
+        local_day_filter('sale__created_at', today, today), company_id=company_id, sale__sold_by_id=cashier_id
+    ), {'total_quantity': Sum('quantity'), 'total_revenue': Sum('total_price')}
+
+
+def _sales_tiles(totals):
+    return {
+        'today_total_quantity': totals['total_quantity'] or 0,
+        'today_sales_birr': totals['total_revenue'] or 0,
+    }
+
+
+def sales_metrics(company_id, cashier_id=None):
+    queryset, aggregates = _sales_queryset(company_id, cashier_id)
+    return _sales_tiles(queryset.aggregate(**aggregates))
+
+
+def _cache_key(company_id, cashier_id, version):
+    return f"dashboard:{company_id}:{cashier_id or 'all'}:{version}"
+
+
+def dashboard_metrics(company, cashier=None):
+    """
+    Every dashboard tile for `company` (and `cashier`, for the till view),
+    cached for DASHBOARD_CACHE_TIMEOUT seconds under a per-company version
+    that sale and stock writes bump.
+    """
+    cashier_id = cashier.pk if cashier else None
+    version = cache.get_or_set(_version_key(company.pk), 1, timeout=None)
+    key = _cache_key(company.pk, cashier_id, version)
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = {**inventory_metrics(company.pk), **sales_metrics(company.pk, cashier_id)}
+        cache.set(key, metrics, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60))
+    return metrics
+
+
+async def adashboard_metrics(company_id, cashier_id=None):
+    """Async (native async ORM and cache calls) version of dashboard_metrics."""
+    version = await cache.aget_or_set(_version_key(company_id), 1, timeout=None)
+    key = _cache_key(company_id, cashier_id, version)
+    metrics = await cache.aget(key)
+    if metrics is None:
+        queryset, aggregates = _sales_queryset(company_id, cashier_id)
+        metrics = {
+            **await _inventory_queryset(company_id).aget(),
+            **expiry_counts(await aexpiry_summary(company_id)),
+            **_sales_tiles(await queryset.aaggregate(**aggregates)),
+        }
+        await cache.aset(key, metrics, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60))
+    return metrics
@@ -0,0 +1,43 @@
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return timezone.localdate(value)
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def local_day_range(date_from=None, date_to=None):
+    """
+    Half-open [start, end) aware datetimes covering the local-timezone days
+    `date_from` .. `date_to` inclusive (either may be None or a YYYY-MM-DD
+    string). Comparing a DateTimeField against these keeps the predicate
+    sargable, unlike `__date` lookups.
+    """
+    tz = timezone.get_current_timezone()
+    start = end = None
+    if date_from:
+        start = timezone.make_aware(datetime.combine(_as_date(date_from), time.min), tz)
+    if date_to:
+        end = timezone.make_aware(datetime.combine(_as_date(date_to) + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def local_day_filter(field, date_from=None, date_to=None):
+    """
+    Q() matching rows whose datetime `field` falls on the local days
+    date_from .. date_to, as `field >= start AND field < end` in UTC so an
+    index on (..., field) can serve it. Either bound may be omitted.
+    """
+    start, end = local_day_range(date_from, date_to)
+    condition = Q()
+    if start:
+        condition &= Q(**{f'{field}__gte': start})
+    if end:
+        condition &= Q(**{f'{field}__lt': end})
+    return condition
@@ -0,0 +1,149 @@
+"""
+Expiry windows, batch lists and the materialized ExpiryBucket counts.
+
+Every view reads expiry through this module, so the windows (critical /
+warning / watch days, per company via ExpiryPolicy) are defined once.
+"""
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from authentication.models import Company
+from .models import ExpiryBucket, ExpiryPolicy, Stock
+
+
+def _days_key(company_id):
+    return f"expiry-days:{company_id}"
+
+
+def expiry_days(company_id):
+    """(critical, warning, watch) window lengths in days for the company."""
+    days = cache.get(_days_key(company_id))
+    if days is None:
+        policy = ExpiryPolicy.objects.filter(company_id=company_id).first()
+        days = policy.days if policy else tuple(getattr(settings, 'EXPIRY_BUCKET_DAYS', (7, 30, 90)))
+        # Bounded: forget_expiry_days() only reaches the cache of the process that saved the policy
+        cache.set(_days_key(company_id), days, getattr(settings, 'EXPIRY_DAYS_CACHE_TIMEOUT', 60))
+    return days
+
+
+def forget_expiry_days(company_id):
+    cache.delete(_days_key(company_id))
+
+
+def live_batches(company_id):
+    """Batches with stock left and an expiry date (stock_company_expiry_qty_idx)."""
+    return Stock.objects.filter(company_id=company_id, expiry_date__isnull=False, quantity__gt=0)
+
+
+def expired_batches(company_id):
+    return live_batches(company_id).filter(expiry_date__lt=timezone.localdate())
+
+
+def expiring_batches(company_id, within_days=None, include_expired=False):
+    """Batches expiring from today up to `within_days` (default: the widest window) ahead."""
+    today = timezone.localdate()
+    days = expiry_days(company_id)[-1] if within_days is None else within_days
+    batches = live_batches(company_id).filter(expiry_date__lte=today + timedelta(days=days))
+    if not include_expired:
+        batches = batches.filter(expiry_date__gte=today)
+    return batches
+
+
+def _windows(today, days):
+    """(bucket, max_days, condition) of every bucket; each window starts where the previous ended."""
+    windows = [(ExpiryBucket.EXPIRED, None, Q(expiry_date__lt=today))]
+    start = today
+    for bucket, max_days in zip((ExpiryBucket.CRITICAL, ExpiryBucket.WARNING, ExpiryBucket.WATCH), days):
+        end = today + timedelta(days=max_days)
+        windows.append((bucket, max_days, Q(expiry_date__gte=start, expiry_date__lte=end)))
+        start = end + timedelta(days=1)
+    return windows
+
+
+def _lock_company(company_id):
+    """Row-lock the company until the transaction ends; serializes bucket refreshes and invalidations."""
+    Company.objects.select_for_update().filter(pk=company_id).exists()
+
+
+def refresh_expiry_buckets(company_id=None):
+    """
+    Recompute the ExpiryBucket rows of one company (or all of them) with one
+    grouped query per company. Returns the number of companies refreshed.
+    """
+    today = timezone.localdate()
+    company_ids = [company_id] if company_id else list(Company.objects.values_list('pk', flat=True))
+    value = ExpressionWrapper(F('quantity') * F('buying_price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+    for cid in company_ids:
+        days = expiry_days(cid)
+        windows = _windows(today, days)
+        aggregates = {}
+        for bucket, _, condition in windows:
+            aggregates[f'batches_{bucket}'] = Count('id', filter=condition)
+            aggregates[f'units_{bucket}'] = Sum('quantity', filter=condition)
+            aggregates[f'value_{bucket}'] = Sum(value, filter=condition)
+        with transaction.atomic():
+            # An invalidation that ran before the lock comes after its stock write, so the totals
+            # below see that write; a later one waits for this commit and deletes what it wrote
+            _lock_company(cid)
+            totals = live_batches(cid).filter(expiry_date__lte=today + timedelta(days=days[-1])).aggregate(**aggregates)
+            ExpiryBucket.objects.filter(company_id=cid).delete()
+            # A concurrent refresh may have written the same rows; they are as fresh as ours
+            ExpiryBucket.objects.bulk_create([
+                ExpiryBucket(
+                    company_id=cid,
+                    bucket=bucket,
+                    max_days=max_days,
+                    batches=totals[f'batches_{bucket}'] or 0,
+                    units=totals[f'units_{bucket}'] or 0,
+                    stock_value=totals[f'value_{bucket}'] or 0,
+                    computed_on=today,
+                )
+                for bucket, max_days, _ in windows
+            ], ignore_conflicts=True)
+    return len(company_ids)
+
+
+def invalidate_expiry_buckets(company_id):
+    """Drop the company's buckets after a stock write; the next read recomputes them."""
+    with transaction.atomic():
+        # Waits for a refresh_expiry_buckets() that may have read the totals before the write
+        _lock_company(company_id)
+        ExpiryBucket.objects.filter(company_id=company_id).delete()
+
+
+def _stale(company_id, rows):
+    """True if the rows are missing, from an earlier day or computed with other windows than the current ones."""
+    if len(rows) != len(ExpiryBucket.BUCKET_CHOICES) or rows[0].computed_on != timezone.localdate():
+        return True
+    return tuple(row.max_days for row in rows[1:]) != tuple(expiry_days(company_id))
+
+
+def expiry_summary(company_id):
+    """The company's ExpiryBucket rows (expired first), recomputed first if stale."""
+    rows = list(ExpiryBucket.objects.filter(company_id=company_id).order_by('bucket'))
+    if _stale(company_id, rows):
+        refresh_expiry_buckets(company_id)
+        rows = list(ExpiryBucket.objects.filter(company_id=company_id).order_by('bucket'))
+    return rows
+
+
+async def aexpiry_summary(company_id):
+    """Async version of expiry_summary; only a stale read falls back to a thread."""
+    rows = [row async for row in ExpiryBucket.objects.filter(company_id=company_id).order_by('bucket')]
+    if await sync_to_async(_stale)(company_id, rows):
+        rows = await sync_to_async(expiry_summary)(company_id)
+    return rows
+
+
+def expiry_counts(rows):
+    """Dashboard tiles from expiry_summary() rows: expired batches and batches inside any window."""
+    return {
+        'expired_count': rows[0].batches,
+        'near_expiry_count': sum(row.batches for row in rows[1:]),
+    }
@@ -0,0 +1,114 @@
+"""
+CSV exports streamed row by row.
+
+Rows are read in primary-key keyset slices of EXPORT_CHUNK_SIZE. The MySQL
+drivers buffer a whole result set client-side, so `.iterator()` alone would
+still hold a year of sales in memory; a slice per query keeps memory bounded
+on every backend, and the header goes out before the first query runs.
+
+Under ASGI Django would read a sync iterator to the end before sending
+anything, so there the lines are handed over as an async iterator that
+pulls EXPORT_CHUNK_SIZE lines per trip to a worker thread.
+"""
+import csv
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import SaleItem
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def _chunked(queryset, fields):
+    """values_list(fields) rows of `queryset` in primary key order, one query per chunk."""
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', *fields)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def _local(value):
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+def _take(iterator, count):
+    return list(islice(iterator, count))
+
+
+async def _aiter_chunks(iterator):
+    """An async iterator over the sync `iterator`, whose ORM queries run in a worker thread."""
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    while True:
+        chunk = await sync_to_async(_take)(iterator, chunk_size)
+        if not chunk:
+            return
+        yield ''.join(chunk)
+
+
+def csv_response(request, filename, header, rows):
+    writer = csv.writer(_Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    content = lines() if 'wsgi.version' in request.META else _aiter_chunks(lines())
+    response = StreamingHttpResponse(content, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+SALE_LINE_HEADER = [
+    'line', 'sale', 'date', 'cashier', 'product', 'barcode', 'category',
+    'quantity', 'unit price', 'total', 'cost',
+]
+
+
+def sale_line_rows(sales):
+    """One row per SaleItem of the sales in `sales` (a filtered Sale queryset)."""
+    items = SaleItem.objects.filter(sale__in=sales.values('pk'))
+    fields = (
+        'sale_id', 'sale__created_at', 'sale__sold_by__username', 'product__name', 'product__barcode',
+        'product__category__name', 'quantity', 'selling_price', 'total_price', 'total_cost',
+    )
+    for pk, sale_id, created_at, cashier, *rest in _chunked(items, fields):
+        yield [pk, sale_id, _local(created_at), cashier or '', *rest]
+
+
+STOCK_BATCH_HEADER = [
+    'batch', 'product', 'barcode', 'category', 'batch number', 'quantity', 'buying price', 'expiry date', 'added',
+]
+
+
+def stock_batch_rows(batches):
+    fields = (
+        'product__name', 'product__barcode', 'product__category__name', 'batch_number',
+        'quantity', 'buying_price', 'expiry_date', 'added_at',
+    )
+    for *row, added_at in _chunked(batches, fields):
+        yield [*row, _local(added_at)]
+
+
+DAILY_SUMMARY_HEADER = ['date', 'total sales', 'items sold']
+
+
+def daily_summary_rows(summaries):
+    # One row per day: a year is a few hundred rows, a single query is enough
+    yield from summaries.order_by('date').values_list('date', 'total_sales', 'total_items_sold').iterator(
+        chunk_size=getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    )
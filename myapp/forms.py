@@ -22,9 +22,18 @@ class ProductForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super(ProductForm, self).__init__(*args, **kwargs)
+        self.company = user.company if user else self.instance.company
         if user:
             self.fields['category'].queryset = Category.objects.filter(company=user.company)
 
+    def clean_barcode(self):
+        barcode = (self.cleaned_data.get('barcode') or '').strip() or None
+        if barcode:
+            duplicates = Product.objects.filter(company=self.company, barcode=barcode).exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise ValidationError("Another product already uses this barcode.")
+        return barcode
+
 class StockForm(forms.ModelForm):
     class Meta:
         model = Stock
@@ -0,0 +1,139 @@
+"""
+Periodic maintenance jobs, run by `manage.py run_worker` instead of inside
+request handlers.
+
+The schedule and a lease per job live in the Job table, so no broker is
+needed and any number of workers can run side by side: a worker runs a job
+only after claiming its row with one conditional UPDATE, and the claim
+succeeds for exactly one of them.
+"""
+import io
+import traceback
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .expiry import refresh_expiry_buckets
+from .models import Job
+from .rollups import rebuild_daily_summaries, rebuild_hourly_sales
+
+
+class PeriodicJob:
+    """`func` run daily at local time `at`, or `every` timedelta after the previous run."""
+
+    def __init__(self, name, func, at=None, every=None):
+        self.name = name
+        self.func = func
+        self.at = at
+        self.every = every
+
+    def next_run(self, after):
+        if self.every:
+            return after + self.every
+        day = timezone.localtime(after).date()
+        moment = timezone.make_aware(datetime.combine(day, self.at))
+        if moment <= after:
+            moment = timezone.make_aware(datetime.combine(day + timedelta(days=1), self.at))
+        return moment
+
+
+def _refresh_expiry():
+    # Right after midnight, so the first dashboard of the day finds today's buckets
+    return f"Refreshed expiry buckets of {refresh_expiry_buckets()} company(ies)."
+
+
+def _rebuild_rollups():
+    """Rebuild yesterday's DailySummary and ProductSalesHour rows, repairing any drift of the live counters."""
+    yesterday = timezone.localdate() - timedelta(days=1)
+    daily = rebuild_daily_summaries(date_from=yesterday, date_to=yesterday)
+    hourly = rebuild_hourly_sales(date_from=yesterday, date_to=yesterday)
+    return f"Rebuilt {daily} daily summary row(s) and {hourly} hourly bucket(s) of {yesterday}."
+
+
+def _reconcile_stock():
+    out = io.StringIO()
+    call_command('reconcile_stock', stdout=out)
+    return out.getvalue().strip()
+
+
+def _clear_sessions():
+    call_command('clearsessions')
+    return "Removed expired sessions."
+
+
+JOBS = {
+    job.name: job
+    for job in (
+        PeriodicJob('refresh_expiry', _refresh_expiry, at=time(0, 5)),
+        PeriodicJob('rebuild_rollups', _rebuild_rollups, at=time(0, 30)),
+        PeriodicJob('reconcile_stock', _reconcile_stock, at=time(3, 0)),
+        PeriodicJob('clear_sessions', _clear_sessions, at=time(4, 0)),
+    )
+}
+
+
+def sync_jobs(now=None):
+    """Create the Job row of every registered job that does not have one yet."""
+    now = now or timezone.now()
+    existing = set(Job.objects.filter(name__in=JOBS).values_list('name', flat=True))
+    # Another worker starting at the same time may insert the same rows
+    Job.objects.bulk_create(
+        [Job(name=name, next_run_at=job.next_run(now)) for name, job in JOBS.items() if name not in existing],
+        ignore_conflicts=True,
+    )
+
+
+def claim_job(name, worker, now=None):
+    """Lease a due job to `worker`; False if it is not due or another worker holds it."""
+    now = now or timezone.now()
+    lease = getattr(settings, 'WORKER_JOB_LEASE', 3600)
+    return bool(
+        Job.objects.filter(name=name, next_run_at__lte=now)
+        .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+        .update(locked_by=worker, locked_until=now + timedelta(seconds=lease), last_started_at=now)
+    )
+
+
+def run_job(name, worker):
+    """Run a job this worker has claimed, then schedule its next run and release the lease."""
+    job = JOBS[name]
+    result, error = '', ''
+    try:
+        result = job.func() or ''
+    except Exception:
+        error = traceback.format_exc()
+
+    finished = timezone.now()
+    next_run_at = job.next_run(finished)
+    updates = {'last_result': result, 'last_error': error}
+    if error:
+        # Try again soon, but never later than the regular schedule
+        retry_at = finished + timedelta(seconds=getattr(settings, 'WORKER_RETRY_DELAY', 300))
+        next_run_at = min(next_run_at, retry_at)
+        updates['failures'] = F('failures') + 1
+    else:
+        updates['failures'] = 0
+    Job.objects.filter(name=name, locked_by=worker).update(
+        next_run_at=next_run_at, locked_by='', locked_until=None, last_finished_at=finished, **updates
+    )
+    return result, error
+
+
+def run_due_jobs(worker, now=None):
+    """Claim and run every job that is due. Returns [(name, result, error)] of the jobs this worker ran."""
+    now = now or timezone.now()
+    sync_jobs(now)
+    ran = []
+    for name in Job.objects.filter(name__in=JOBS, next_run_at__lte=now).order_by('next_run_at').values_list('name', flat=True):
+        if claim_job(name, worker):
+            ran.append((name, *run_job(name, worker)))
+    return ran
+
+
+def schedule_now(name):
+    """Make a job due immediately; the next worker poll runs it."""
+    sync_jobs()
+    return Job.objects.filter(name=name).update(next_run_at=timezone.now())
@@ -0,0 +1,53 @@
+"""
+In-process fan-out of dashboard updates to Server-Sent Events streams.
+
+Dashboards subscribe from the ASGI event loop; sales and stock writes publish
+from the (threaded) sync views once their transaction has committed. Only
+subscribers in the same process receive an event, so run the app from a
+single ASGI process (see myproject/asgi.py) for the live feed to see every
+write.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+_subscribers = defaultdict(set)
+_lock = threading.Lock()
+
+QUEUE_SIZE = 100
+
+
+def subscribe(company_id):
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    with _lock:
+        _subscribers[company_id].add((asyncio.get_running_loop(), queue))
+    return queue
+
+
+def unsubscribe(company_id, queue):
+    with _lock:
+        _subscribers[company_id] = {sub for sub in _subscribers[company_id] if sub[1] is not queue}
+        if not _subscribers[company_id]:
+            del _subscribers[company_id]
+
+
+def has_subscribers(company_id):
+    return company_id in _subscribers
+
+
+def _offer(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        pass  # a stalled client misses updates; it resyncs on reconnect
+
+
+def publish(company_id, event, data):
+    """Send (event, data) to every dashboard stream of the company. Thread-safe."""
+    with _lock:
+        subscribers = list(_subscribers.get(company_id, ()))
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(_offer, queue, (event, data))
+        except RuntimeError:
+            pass  # loop already closed, the stream is going away
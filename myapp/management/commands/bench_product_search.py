@@ -0,0 +1,102 @@
+import importlib.util
+import statistics
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, RequestFactory
+from django.urls import reverse
+
+from authentication.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure p50/p99 latency of the product search endpoint with a new database "
+        "connection per request, with persistent connections and, when a pool is configured "
+        "(DB_POOL_SIZE) or --pool-size is given, with a connection pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="User the requests are made as (their company's catalog is searched).")
+        parser.add_argument('--query', default='a', help="Search term (default: 'a').")
+        parser.add_argument('--requests', type=int, default=500, help="Measured requests per mode (default: 500).")
+        parser.add_argument('--warmup', type=int, default=20, help="Unmeasured requests per mode (default: 20).")
+        parser.add_argument(
+            '--pool-size', type=int,
+            help="Also measure a connection pool of this size (needs django-db-connection-pool).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}.")
+
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        path = reverse('product_search')
+        factory = RequestFactory()
+        handler = WSGIHandler()
+
+        def request():
+            # The full WSGI cycle, so request_finished closes (or keeps) the connection
+            environ = factory.get(path, {'q': options['query']}, HTTP_HOST=host, HTTP_COOKIE=cookie).environ
+            start = time.perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError(f"{path} answered {response.status_code}.")
+            return elapsed
+
+        db = connections['default'].settings_dict
+        configured = {key: db.get(key) for key in ('ENGINE', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'POOL_OPTIONS')}
+        # The pool backends (dj_db_conn_pool.backends.<vendor>) wrap Django's own backend of the same name
+        pooled = configured['ENGINE'].startswith('dj_db_conn_pool.')
+        vendor = configured['ENGINE'].rsplit('.', 1)[-1]
+        plain_engine = f'django.db.backends.{vendor}' if pooled else configured['ENGINE']
+        pool_options = configured['POOL_OPTIONS'] if pooled else None
+        if options['pool_size']:
+            if importlib.util.find_spec('dj_db_conn_pool') is None:
+                raise CommandError("--pool-size needs the django-db-connection-pool package.")
+            pool_options = {**(pool_options or {}), 'POOL_SIZE': options['pool_size']}
+        self.stdout.write(f"{configured['ENGINE']} / {db['NAME']}, {options['requests']} requests per mode")
+
+        modes = [
+            ("new connection per request", plain_engine, 0, False, None),
+            ("persistent connections", plain_engine, (not pooled and configured['CONN_MAX_AGE']) or 600, True, None),
+        ]
+        if pool_options:
+            # Closing a pooled connection at the end of the request returns it to the pool
+            modes.append(
+                (f"pool of {pool_options['POOL_SIZE']}", f'dj_db_conn_pool.backends.{vendor}', 0, False, pool_options)
+            )
+        try:
+            for label, engine, max_age, health_checks, pool in modes:
+                self._configure(db, ENGINE=engine, CONN_MAX_AGE=max_age, CONN_HEALTH_CHECKS=health_checks, POOL_OPTIONS=pool)
+                for _ in range(options['warmup']):
+                    request()
+                timings = [request() * 1000 for _ in range(options['requests'])]
+                percentiles = statistics.quantiles(timings, n=100)
+                self.stdout.write(
+                    f"{label:<28} p50 {percentiles[49]:7.2f} ms   p99 {percentiles[98]:7.2f} ms"
+                )
+        finally:
+            self._configure(db, **configured)
+
+    def _configure(self, db, **values):
+        """Switch the default connection to `values`; the next query opens it with the new backend."""
+        connections.close_all()
+        for key, value in values.items():
+            if value is None:
+                db.pop(key, None)
+            else:
+                db[key] = value
+        # The connection object is bound to its backend, so drop it and let it be rebuilt
+        del connections['default']
@@ -0,0 +1,39 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import Company
+from myapp.catalog_import import import_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Import products from a CSV (name, category, barcode, selling_price[, low_stock_threshold]) "
+        "into a company's catalog, creating missing categories and updating products with the same barcode."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row.")
+        parser.add_argument('--company', type=int, required=True, help="Company id to import into.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Products per INSERT (default: 1000).")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company'])
+        except Company.DoesNotExist:
+            raise CommandError(f"No company with id {options['company']}.")
+
+        started = time.monotonic()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as f:
+                result = import_catalog(company, csv.DictReader(f), batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.imported} product(s), new categories: {result.categories_created}, "
+            f"{len(result.errors)} row(s) skipped, in {time.monotonic() - started:.1f}s."
+        ))
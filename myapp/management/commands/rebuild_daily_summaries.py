@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from myapp.rollups import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute DailySummary rows from SaleItem, per company and day."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Only rebuild this company id.")
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help="First day (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help="Last day (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_summaries(options['company'], options['date_from'], options['date_to'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily summary row(s)."))
@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from myapp.rollups import rebuild_hourly_sales
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-product hourly sales buckets (ProductSalesHour) from SaleItem."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Only rebuild this company id.")
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, help="First local day (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, help="Last local day (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        count = rebuild_hourly_sales(options['company'], options['date_from'], options['date_to'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} hourly sales bucket(s)."))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from myapp.models import Product, Stock
+
+
+class Command(BaseCommand):
+    help = "Recompute Product.stock_on_hand from Stock batches and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Only reconcile products of this company id.")
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing.")
+
+    def handle(self, *args, **options):
+        totals = (
+            Stock.objects.filter(product=OuterRef('pk'))
+            .order_by().values('product')
+            .annotate(total=Sum('quantity')).values('total')
+        )
+        products = Product.objects.annotate(
+            actual=Coalesce(Subquery(totals, output_field=IntegerField()), 0)
+        )
+        if options['company']:
+            products = products.filter(company_id=options['company'])
+
+        with transaction.atomic():
+            drifted = []
+            for product in products.select_for_update(of=('self',)).only('id', 'name', 'stock_on_hand'):
+                if product.stock_on_hand != product.actual:
+                    self.stdout.write(
+                        f"{product.name} (#{product.id}): {product.stock_on_hand} -> {product.actual}"
+                    )
+                    product.stock_on_hand = product.actual
+                    drifted.append(product)
+
+            if drifted and not options['dry_run']:
+                Product.objects.bulk_update(drifted, ['stock_on_hand'], batch_size=500)
+
+        verb = "Found" if options['dry_run'] else "Repaired"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(drifted)} product(s) with stock drift."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from myapp.expiry import refresh_expiry_buckets
+
+
+class Command(BaseCommand):
+    help = "Recompute the ExpiryBucket counts (expired / critical / warning / watch). Run nightly after midnight."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help="Only refresh this company id.")
+
+    def handle(self, *args, **options):
+        refreshed = refresh_expiry_buckets(options['company'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed expiry buckets of {refreshed} company(ies)."))
@@ -0,0 +1,57 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from myapp.jobs import JOBS, run_due_jobs, schedule_now
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the periodic maintenance jobs (expiry refresh, rollup rebuild, stock reconciliation, "
+        "session cleanup) as they fall due. Any number of workers may run; each job runs on one of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the due jobs once and exit.")
+        parser.add_argument(
+            '--run', action='append', default=[], choices=sorted(JOBS), metavar='JOB',
+            help=f"Make JOB due now (repeatable): {', '.join(sorted(JOBS))}.",
+        )
+        parser.add_argument(
+            '--poll', type=float, default=getattr(settings, 'WORKER_POLL_INTERVAL', 30),
+            help="Seconds between looks for due jobs.",
+        )
+
+    def handle(self, *args, **options):
+        if options['poll'] <= 0:
+            raise CommandError("--poll must be positive.")
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        for name in options['run']:
+            schedule_now(name)
+
+        stopping = []
+        # Finish the running job, then exit
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stopping.append(True))
+
+        self.stdout.write(f"Worker {worker} started.")
+        while not stopping:
+            # A long-lived process must not keep a connection the server has timed out
+            close_old_connections()
+            for name, result, error in run_due_jobs(worker):
+                if error:
+                    self.stderr.write(f"{name} failed:\n{error}")
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"{name}: {result}"))
+            if options['once']:
+                break
+            deadline = time.monotonic() + options['poll']
+            while not stopping and time.monotonic() < deadline:
+                time.sleep(min(1, options['poll']))
+        close_old_connections()
+        self.stdout.write(f"Worker {worker} stopped.")
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:36
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_stock_on_hand(apps, schema_editor):
+    Product = apps.get_model('myapp', 'Product')
+    Stock = apps.get_model('myapp', 'Stock')
+    totals = (
+        Stock.objects.filter(product=OuterRef('pk'))
+        .order_by().values('product')
+        .annotate(total=Sum('quantity')).values('total')
+    )
+    Product.objects.update(stock_on_hand=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_category_company_dailysummary_company_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_on_hand',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_stock_on_hand, migrations.RunPython.noop),
+    ]
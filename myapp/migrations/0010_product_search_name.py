@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+def backfill_search_name(apps, schema_editor):
+    Product = apps.get_model('myapp', 'Product')
+    batch = []
+    for product in Product.objects.only('id', 'name').iterator(chunk_size=2000):
+        product.search_name = " ".join((product.name or "").split()).lower()
+        batch.append(product)
+        if len(batch) >= 2000:
+            Product.objects.bulk_update(batch, ['search_name'])
+            batch = []
+    Product.objects.bulk_update(batch, ['search_name'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_product_stock_on_hand'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(backfill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['company', 'barcode'], name='product_company_barcode_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['company', 'search_name'], name='product_company_search_idx'),
+        ),
+    ]
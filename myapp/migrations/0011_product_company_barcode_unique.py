@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:41
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def clean_barcodes(apps, schema_editor):
+    Product = apps.get_model('myapp', 'Product')
+    # Empty barcodes mean "no barcode"; NULLs don't collide in the unique index
+    Product.objects.filter(barcode='').update(barcode=None)
+    duplicates = list(
+        Product.objects.exclude(barcode=None)
+        .values('company_id', 'barcode')
+        .annotate(n=Count('id')).filter(n__gt=1)
+        .values_list('company_id', 'barcode')[:20]
+    )
+    if duplicates:
+        raise RuntimeError(
+            "Products share a barcode within the same company, fix them before migrating "
+            f"(company_id, barcode): {duplicates}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_product_search_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(clean_barcodes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('company', 'barcode'), name='product_company_barcode_uniq'),
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_company_barcode_idx',
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:43
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def rebuild_summaries(apps, schema_editor):
+    # Existing rows were keyed on date alone and shared by every company
+    DailySummary = apps.get_model('myapp', 'DailySummary')
+    SaleItem = apps.get_model('myapp', 'SaleItem')
+    DailySummary.objects.all().delete()
+    rows = (
+        SaleItem.objects.annotate(day=TruncDate('sale__created_at'))
+        .order_by().values('sale__company_id', 'day')
+        .annotate(total_sales=Sum('total_price'), total_items_sold=Sum('quantity'))
+    )
+    DailySummary.objects.bulk_create(
+        [
+            DailySummary(
+                company_id=row['sale__company_id'],
+                date=row['day'],
+                total_sales=row['total_sales'] or 0,
+                total_items_sold=row['total_items_sold'] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_product_company_barcode_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailysummary',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.RunPython(rebuild_summaries, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailysummary',
+            constraint=models.UniqueConstraint(fields=('company', 'date'), name='dailysummary_company_date_uniq'),
+        ),
+    ]
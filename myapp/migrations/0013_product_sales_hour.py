@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_alter_customuser_company'),
+        ('myapp', '0012_dailysummary_per_company'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='total_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='ProductSalesHour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('company', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='authentication.company')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_hours', to='myapp.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'hour'], name='productsaleshour_company_hour')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productsaleshour',
+            constraint=models.UniqueConstraint(fields=('company', 'product', 'hour'), name='productsaleshour_uniq'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_stock_company(apps, schema_editor):
+    # add_stock did not set Stock.company; take it from the product
+    Stock = apps.get_model('myapp', 'Stock')
+    Product = apps.get_model('myapp', 'Product')
+    Stock.objects.filter(company__isnull=True).update(
+        company=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('company')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0013_product_sales_hour'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_stock_company, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['company', 'name'], name='product_company_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['company', 'created_at'], name='sale_company_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['sold_by', 'created_at'], name='sale_sold_by_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['company', 'sale'], name='saleitem_company_sale_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['company', 'expiry_date'], name='stock_company_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['product', 'quantity', 'added_at'], name='stock_fifo_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_alter_customuser_company'),
+        ('myapp', '0015_category_unique_per_company'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpiryBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveSmallIntegerField(choices=[(0, 'Expired'), (1, 'Critical'), (2, 'Warning'), (3, 'Watch')])),
+                ('max_days', models.PositiveIntegerField(blank=True, null=True)),
+                ('batches', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('stock_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('computed_on', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExpiryPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('critical_days', models.PositiveIntegerField(default=7)),
+                ('warning_days', models.PositiveIntegerField(default=30)),
+                ('watch_days', models.PositiveIntegerField(default=90)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='stock',
+            name='stock_company_expiry_idx',
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['company', 'expiry_date', 'quantity'], name='stock_company_expiry_qty_idx'),
+        ),
+        migrations.AddField(
+            model_name='expirypolicy',
+            name='company',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='expiry_policy', to='authentication.company'),
+        ),
+        migrations.AddField(
+            model_name='expirybucket',
+            name='company',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='authentication.company'),
+        ),
+        migrations.AddConstraint(
+            model_name='expirybucket',
+            constraint=models.UniqueConstraint(fields=('company', 'bucket'), name='expirybucket_company_bucket_uniq'),
+        ),
+    ]
@@ -1,17 +1,31 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from datetime import date
-from django.db.models import Sum
+from django.db.models import Sum, F
 from datetime import date, timedelta
 from django.conf import settings
+from django.utils import timezone
 from authentication.models import Company
+
+
+def normalize_name(value):
+    """Lower-case, whitespace-collapsed form of a name used for prefix lookups."""
+    return " ".join((value or "").split()).lower()
+
 # =========================
 # CATEGORY
 # =========================
 class Category(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True)
-    name = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            # Category names are per store, not global
+            models.UniqueConstraint(fields=['company', 'name'], name='category_company_name_uniq'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -23,27 +37,78 @@ class Category(models.Model):
 class Product(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=200)
+    # normalize_name(name), so prefix search can use a plain index range scan
+    search_name = models.CharField(max_length=200, default='', editable=False)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     barcode = models.CharField(max_length=100, blank=True, null=True)
     selling_price = models.DecimalField(max_digits=10, decimal_places=2)
     low_stock_threshold = models.PositiveIntegerField(default=10)  # NEW FIELD
+    # Denormalized SUM(batches.quantity), kept in step by Stock.save()/delete()
+    # and repaired by `manage.py reconcile_stock`.
+    stock_on_hand = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     # created_by = models.ForeignKey(
     #     settings.AUTH_USER_MODEL,
     #     on_delete=models.CASCADE,
     #     related_name='products', null=True, blank=True
     # )
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'search_name'], name='product_company_search_idx'),
+            models.Index(fields=['company', 'name'], name='product_company_name_idx'),
+        ]
+        constraints = [
+            # Also the index behind exact barcode lookups (scanner endpoint, search)
+            models.UniqueConstraint(fields=['company', 'barcode'], name='product_company_barcode_uniq'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # stock_on_hand is only ever moved by F() updates; writing back the value read
+            # with this instance would undo every sale committed since it was loaded
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'stock_on_hand' and f.attname not in deferred
+            ]
+        elif update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_name'}
+        super().save(*args, **kwargs)
+
     @property
     def total_stock(self):
-        return self.batches.aggregate(total=models.Sum('quantity'))['total'] or 0
+        return self.stock_on_hand
 
     @property
     def low_stock(self):
         """Returns True if total stock is below threshold."""
         return self.total_stock <= self.low_stock_threshold
+
+    @classmethod
+    def adjust_stock_on_hand(cls, product_id, delta):
+        """Atomically shift the on-hand counter of one product by `delta` units."""
+        if product_id and delta:
+            cls.objects.filter(pk=product_id).update(stock_on_hand=F('stock_on_hand') + delta)
+
+
+class StockQuerySet(models.QuerySet):
+    def delete(self):
+        """Bulk delete (e.g. the admin action) that also releases the on-hand counters."""
+        with transaction.atomic():
+            removed = list(
+                self.order_by().values('product_id').annotate(total=Sum('quantity'))
+            )
+            result = super().delete()
+            for row in removed:
+                Product.adjust_stock_on_hand(row['product_id'], -(row['total'] or 0))
+        return result
+
+
 class Stock(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True)
     product = models.ForeignKey(Product,related_name="batches", on_delete=models.CASCADE)
@@ -53,35 +118,66 @@ class Stock(models.Model):
     expiry_date = models.DateField(blank=True, null=True)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    objects = StockQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Expired / near-expiry lists and buckets: (company, expiry_date) range
+            # scans that check quantity > 0 in the index (MySQL has no partial indexes)
+            models.Index(fields=['company', 'expiry_date', 'quantity'], name='stock_company_expiry_qty_idx'),
+            # FIFO allocation: a product's batches with stock left, oldest first
+            models.Index(fields=['product', 'quantity', 'added_at'], name='stock_fifo_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - {self.quantity} units"
-    @property
-    def total_stock(self):
-        return self.batches.aggregate(total=models.Sum('quantity'))['total'] or 0
 
-    @property
-    def low_stock(self):
-        return self.total_stock <= self.low_stock_threshold
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this batch contributed to Product.stock_on_hand when loaded
+        instance._loaded_stock = (instance.__dict__.get('product_id'), instance.__dict__.get('quantity'))
+        return instance
 
-    @property
-    def has_expired(self):
-        """Return True if any related batch is expired."""
-        # batches is the related_name from Stock/Batch foreign key
-        return any(getattr(batch, 'expiry_date', None) and batch.expiry_date < date.today()
-                   for batch in self.batches.all())
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        old_product_id, old_quantity = getattr(self, '_loaded_stock', (None, None))
+        with transaction.atomic():
+            if not adding and old_quantity is None:
+                old_product_id, old_quantity = (
+                    Stock.objects.filter(pk=self.pk).values_list('product_id', 'quantity').first()
+                    or (None, None)
+                )
+            super().save(*args, **kwargs)
+            if old_product_id == self.product_id:
+                Product.adjust_stock_on_hand(self.product_id, self.quantity - (old_quantity or 0))
+            else:
+                Product.adjust_stock_on_hand(old_product_id, -(old_quantity or 0))
+                Product.adjust_stock_on_hand(self.product_id, self.quantity)
+        self._loaded_stock = (self.product_id, self.quantity)
 
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            quantity = Stock.objects.filter(pk=self.pk).values_list('quantity', flat=True).first() or 0
+            result = super().delete(*args, **kwargs)
+            Product.adjust_stock_on_hand(self.product_id, -quantity)
+        return result
     @property
-    def has_near_expiry(self):
-        """Return True if any related batch expires within next 90 days (including today)."""
-        warn_until = date.today() + timedelta(days=90)
-        return any(getattr(batch, 'expiry_date', None) and date.today() <= batch.expiry_date <= warn_until
-                   for batch in self.batches.all())
+    def is_expired(self):
+        return bool(self.expiry_date) and self.expiry_date < timezone.localdate()
+
+
 class DailySummary(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True)
-    date = models.DateField(unique=True)
+    date = models.DateField()
     total_sales = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total_items_sold = models.IntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'date'], name='dailysummary_company_date_uniq'),
+        ]
+
     def __str__(self):
         return f"Summary - {self.date}"
 class Sale(models.Model):
@@ -93,6 +189,19 @@ class Sale(models.Model):
         on_delete=models.CASCADE,
         related_name='sales', null=True, blank=True
     )
+    # Client-generated key of the submission; a replay of the same key returns this sale
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'idempotency_key'], name='sale_company_idempotency_uniq'),
+        ]
+        indexes = [
+            # Sales history, newest first, per company and per cashier
+            models.Index(fields=['company', 'created_at'], name='sale_company_created_idx'),
+            models.Index(fields=['sold_by', 'created_at'], name='sale_sold_by_created_idx'),
+        ]
+
     def __str__(self):
         return f"Sale #{self.id} - {self.created_at.date()}"
 
@@ -106,6 +215,12 @@ class SaleItem(models.Model):
     quantity = models.PositiveIntegerField()
     selling_price = models.DecimalField(max_digits=10, decimal_places=2)  # price per unit
     total_price = models.DecimalField(max_digits=12, decimal_places=2)  # quantity * selling_price
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # FIFO buying cost of the units sold
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'sale'], name='saleitem_company_sale_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
@@ -113,3 +228,88 @@ class SaleItem(models.Model):
     def save(self, *args, **kwargs):
         self.total_price = self.quantity * self.selling_price
         super().save(*args, **kwargs)
+
+
+class ProductSalesHour(models.Model):
+    """Units, revenue and cost of one product sold in one (UTC) hour, maintained by checkout."""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True)
+    product = models.ForeignKey(Product, related_name="sales_hours", on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'product', 'hour'], name='productsaleshour_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['company', 'hour'], name='productsaleshour_company_hour'),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} @ {self.hour:%Y-%m-%d %H}:00 - {self.quantity} units"
+
+
+class ExpiryPolicy(models.Model):
+    """A company's expiry warning windows in days; companies without one use EXPIRY_BUCKET_DAYS."""
+    company = models.OneToOneField(Company, related_name="expiry_policy", on_delete=models.CASCADE)
+    critical_days = models.PositiveIntegerField(default=7)
+    warning_days = models.PositiveIntegerField(default=30)
+    watch_days = models.PositiveIntegerField(default=90)
+
+    def __str__(self):
+        return f"{self.company}: {self.critical_days}/{self.warning_days}/{self.watch_days} days"
+
+    def clean(self):
+        if not self.critical_days <= self.warning_days <= self.watch_days:
+            raise ValidationError("The windows must be increasing: critical <= warning <= watch.")
+
+    @property
+    def days(self):
+        return (self.critical_days, self.warning_days, self.watch_days)
+
+
+class ExpiryBucket(models.Model):
+    """
+    Batches with stock left of one company, per expiry window, as of
+    `computed_on`. Materialized nightly by the refresh_expiry job (run_worker);
+    stock writes drop the company's rows and the next read recomputes them.
+    """
+    EXPIRED, CRITICAL, WARNING, WATCH = range(4)
+    BUCKET_CHOICES = [(EXPIRED, "Expired"), (CRITICAL, "Critical"), (WARNING, "Warning"), (WATCH, "Watch")]
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True)
+    bucket = models.PositiveSmallIntegerField(choices=BUCKET_CHOICES)
+    max_days = models.PositiveIntegerField(null=True, blank=True)  # window end in days from computed_on; None = expired
+    batches = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    stock_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # units at buying price
+    computed_on = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'bucket'], name='expirybucket_company_bucket_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_bucket_display()} - {self.batches} batches ({self.computed_on})"
+
+
+class Job(models.Model):
+    """
+    Schedule and lease of one periodic job of myapp/jobs.py. A worker runs
+    a job only after claiming its row, so each run happens on one worker.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    next_run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)  # worker holding the lease, '' when free
+    locked_until = models.DateTimeField(null=True, blank=True)  # lease expiry; a crashed worker's lease lapses
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    last_result = models.TextField(blank=True)
+    last_error = models.TextField(blank=True)
+    failures = models.PositiveIntegerField(default=0)  # consecutive failed runs
+
+    def __str__(self):
+        return f"{self.name} (next run {self.next_run_at:%Y-%m-%d %H:%M})"
@@ -0,0 +1,69 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class KeysetPage:
+    """One page of a (created_at, id) keyset-paginated queryset, newest first."""
+
+    def __init__(self, object_list, has_next, has_previous, query):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self._query = query
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def _link(self, direction, row):
+        query = self._query.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        query.pop('page', None)
+        query[direction] = f"{row.created_at.isoformat()}|{row.pk}"
+        return query.urlencode()
+
+    @property
+    def next_query(self):
+        return self._link('after', self.object_list[-1]) if self.has_next else ''
+
+    @property
+    def previous_query(self):
+        return self._link('before', self.object_list[0]) if self.has_previous else ''
+
+
+def _parse_cursor(value):
+    try:
+        created_at, pk = value.rsplit('|', 1)
+        created_at = parse_datetime(created_at)
+        return (created_at, int(pk)) if created_at else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def keyset_paginate(queryset, request, per_page):
+    """
+    Slice `queryset` with a WHERE on (created_at, id) instead of OFFSET, using
+    the `after` / `before` cursors in the query string. Only one page (plus
+    one look-ahead row) is fetched, and no COUNT(*) is run.
+    """
+    after = _parse_cursor(request.GET.get('after'))
+    before = None if after else _parse_cursor(request.GET.get('before'))
+
+    if before:
+        created_at, pk = before
+        rows = list(
+            queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+            .order_by('created_at', 'id')[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, has_next=bool(rows), has_previous=has_previous, query=request.GET)
+
+    if after:
+        created_at, pk = after
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    rows = list(queryset.order_by('-created_at', '-id')[:per_page + 1])
+    return KeysetPage(rows[:per_page], has_next=len(rows) > per_page, has_previous=bool(after), query=request.GET)
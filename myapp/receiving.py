@@ -0,0 +1,170 @@
+import csv
+import io
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .dashboard import bump_dashboard_version, inventory_metrics
+from .expiry import invalidate_expiry_buckets
+from .live import has_subscribers, publish
+from .models import Product, Stock
+
+# Columns of an uploaded delivery CSV; a row names its product by barcode or product_id
+CSV_COLUMNS = ('barcode', 'product_id', 'quantity', 'buying_price', 'selling_price', 'expiry_date', 'batch_number')
+
+# Largest quantity one row may book; keeps the unsigned integer quantity and on-hand columns far from overflow
+MAX_ROW_QUANTITY = 1_000_000
+
+
+def rows_from_post(post):
+    """The multi-row receiving form (`product_id[]`, `quantity[]`, ...) as a list of row dicts."""
+    columns = {name: post.getlist(f'{name}[]') for name in CSV_COLUMNS}
+    count = max(len(values) for values in columns.values())
+    rows = [
+        {name: values[i] if i < len(values) else '' for name, values in columns.items()}
+        for i in range(count)
+    ]
+    # Rows the user added but left empty are not errors
+    return [row for row in rows if any((value or '').strip() for value in row.values())]
+
+
+def rows_from_csv(uploaded_file):
+    try:
+        reader = csv.DictReader(io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig'))
+        fields = {(name or '').strip().lower() for name in reader.fieldnames or ()}
+        if 'quantity' not in fields or not fields & {'barcode', 'product_id'}:
+            raise ValidationError("The CSV needs a header row with quantity and barcode or product_id columns.")
+        return [
+            {(name or '').strip().lower(): (value or '') for name, value in row.items()}
+            for row in reader
+        ]
+    except UnicodeDecodeError:
+        raise ValidationError("The CSV file must be UTF-8 encoded.")
+    except csv.Error as e:
+        raise ValidationError(f"Could not read the CSV file: {e}")
+
+
+def _price(value, label, errors, required=True):
+    value = (value or '').strip()
+    if not value:
+        if required:
+            errors.append(f"{label} is required.")
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        price = None
+    # NaN and Infinity parse, but NaN raises on comparison and neither fits the column
+    if price is None or not price.is_finite():
+        errors.append(f"Invalid {label.lower()} {value!r}.")
+        return None
+    if not 0 < price < 10 ** 8:
+        errors.append(f"{label} must be positive and below 100,000,000.")
+        return None
+    return price.quantize(Decimal('0.01'))
+
+
+def parse_delivery(company, rows):
+    """
+    Validate every row of a delivery against one product lookup and return
+    (product, quantity, buying_price, selling_price or None, expiry_date, batch_number)
+    lines. Raises ValidationError listing every bad row.
+    """
+    if not rows:
+        raise ValidationError("The delivery has no rows.")
+
+    ids = {row.get('product_id', '').strip() for row in rows} - {''}
+    barcodes = {row.get('barcode', '').strip() for row in rows} - {''}
+    products = Product.objects.filter(
+        Q(id__in=[pid for pid in ids if pid.isdigit()]) | Q(barcode__in=barcodes), company=company
+    )
+    by_id, by_barcode = {}, {}
+    for product in products:
+        by_id[str(product.id)] = product
+        if product.barcode:
+            by_barcode[product.barcode] = product
+
+    lines, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        row_errors = []
+        pid, barcode = row.get('product_id', '').strip(), row.get('barcode', '').strip()
+        product = by_id.get(pid) if pid else by_barcode.get(barcode)
+        if product is None:
+            row_errors.append(f"Product {pid or barcode or '(none)'} not found.")
+
+        quantity = (row.get('quantity') or '').strip()
+        # isdigit() also accepts superscripts, which int() rejects
+        if not quantity.isdecimal() or not 0 < int(quantity) <= MAX_ROW_QUANTITY:
+            row_errors.append(
+                f"Quantity must be a whole number from 1 to {MAX_ROW_QUANTITY:,}, got {quantity!r}."
+            )
+
+        buying_price = _price(row.get('buying_price'), "Buying price", row_errors)
+        selling_price = _price(row.get('selling_price'), "Selling price", row_errors, required=False)
+
+        expiry_date = (row.get('expiry_date') or '').strip() or None
+        if expiry_date:
+            try:
+                expiry_date = date.fromisoformat(expiry_date)
+            except ValueError:
+                row_errors.append(f"Invalid expiry date {expiry_date!r}, use YYYY-MM-DD.")
+
+        if row_errors:
+            errors.extend(f"Row {number}: {error}" for error in row_errors)
+        else:
+            batch_number = (row.get('batch_number') or '').strip() or None
+            lines.append((product, int(quantity), buying_price, selling_price, expiry_date, batch_number))
+
+    if errors:
+        raise ValidationError(errors)
+    return lines
+
+
+def book_delivery(company, lines):
+    """
+    Book a validated delivery in one transaction: one bulk INSERT of Stock
+    batches, one UPDATE of the on-hand counters and one bulk UPDATE of the
+    selling prices that changed. Returns the created batches.
+    """
+    stamp = timezone.localtime().strftime('%Y%m%d%H%M%S')
+    batches, received, repriced = [], defaultdict(int), {}
+    for product, quantity, buying_price, selling_price, expiry_date, batch_number in lines:
+        batches.append(Stock(
+            company=company,
+            product=product,
+            quantity=quantity,
+            buying_price=buying_price,
+            batch_number=batch_number or f"{product.id}-{stamp}",
+            expiry_date=expiry_date,
+        ))
+        received[product.id] += quantity
+        if selling_price is not None and selling_price != product.selling_price:
+            product.selling_price = selling_price
+            repriced[product.id] = product
+
+    with transaction.atomic():
+        batches = Stock.objects.bulk_create(batches, batch_size=500)
+        # bulk_create bypasses Stock.save(), so book the on-hand counters here
+        Product.objects.filter(pk__in=received).update(
+            stock_on_hand=F('stock_on_hand') + Case(
+                *[When(pk=pid, then=Value(qty)) for pid, qty in received.items()],
+                default=Value(0),
+            )
+        )
+        Product.objects.bulk_update(repriced.values(), ['selling_price'], batch_size=500)
+
+        # No post_save signals fired either: invalidate the caches and push the tiles once
+        company_id = company.pk if company else None
+        if repriced:
+            transaction.on_commit(lambda: bump_catalog_version(company_id))
+        transaction.on_commit(lambda: invalidate_expiry_buckets(company_id))
+        transaction.on_commit(lambda: bump_dashboard_version(company_id))
+        if has_subscribers(company_id):
+            transaction.on_commit(lambda: publish(company_id, 'inventory', inventory_metrics(company_id)))
+    return batches
@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Aggregate, CharField, Exists, OuterRef, Sum
+
+from .dates import local_day_filter
+from .models import SaleItem
+
+# Backends with a native string aggregate that GroupConcat can compile to
+GROUP_CONCAT_VENDORS = ('mysql', 'sqlite', 'postgresql')
+
+
+class GroupConcat(Aggregate):
+    """Comma-separated string aggregate: GROUP_CONCAT on MySQL/SQLite, STRING_AGG on PostgreSQL."""
+    function = 'GROUP_CONCAT'
+    template = "%(function)s(%(distinct)s%(expressions)s SEPARATOR ', ')"
+    allow_distinct = True
+    output_field = CharField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="%(function)s(%(expressions)s, ', ')", **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, function='STRING_AGG',
+            template="%(function)s(%(distinct)s%(expressions)s, ', ')", **extra_context
+        )
+
+
+def filter_sales(sales, search='', category=None, product_id=None, date_from=None, date_to=None, sold_by=None):
+    """The sales report filters (a sale matches if any of its lines does), shared by the pages and exports."""
+    if search:
+        sales = sales.filter(Exists(SaleItem.objects.filter(sale=OuterRef('pk'), product__name__icontains=search)))
+    if category:
+        sales = sales.filter(Exists(SaleItem.objects.filter(sale=OuterRef('pk'), product__category_id=category)))
+    if product_id:
+        sales = sales.filter(Exists(SaleItem.objects.filter(sale=OuterRef('pk'), product_id=product_id)))
+    if date_from or date_to:
+        sales = sales.filter(local_day_filter('created_at', date_from, date_to))
+    if sold_by:
+        sales = sales.filter(sold_by=sold_by)
+    return sales
+
+
+def annotate_sale_totals(sales):
+    """
+    Add total_items, items_total and (where the backend can) product_names to
+    every sale with one GROUP BY, instead of summing prefetched items in Python.
+    """
+    sales = sales.annotate(
+        total_items=Sum('items__quantity'),
+        items_total=Sum('items__total_price'),
+    )
+    if connection.vendor in GROUP_CONCAT_VENDORS:
+        sales = sales.annotate(product_names=GroupConcat('items__product__name'))
+    return sales
+
+
+def attach_product_names(sales):
+    """Fallback for backends without a string aggregate: one query for the whole page."""
+    if connection.vendor in GROUP_CONCAT_VENDORS:
+        return
+    names = defaultdict(list)
+    rows = (
+        SaleItem.objects.filter(sale__in=[sale.pk for sale in sales])
+        .order_by('id').values_list('sale_id', 'product__name')
+    )
+    for sale_id, name in rows:
+        names[sale_id].append(name)
+    for sale in sales:
+        sale.product_names = ", ".join(names[sale.pk])
@@ -0,0 +1,161 @@
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate, TruncHour
+
+from .dates import local_day_filter
+from .models import DailySummary, ProductSalesHour, SaleItem
+
+
+def record_daily_sale(company, day, total_sales, items_sold):
+    """
+    Add one sale to the company's DailySummary row for `day`.
+
+    The increment is a single UPDATE ... SET x = x + n, so concurrent
+    checkouts never lose each other's totals; the row is created on the
+    first sale of the day. Call inside the sale transaction.
+    """
+    increments = {
+        'total_sales': F('total_sales') + total_sales,
+        'total_items_sold': F('total_items_sold') + items_sold,
+    }
+    if DailySummary.objects.filter(company=company, date=day).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            DailySummary.objects.create(
+                company=company, date=day, total_sales=total_sales, total_items_sold=items_sold
+            )
+    except IntegrityError:
+        # Another till created today's row first
+        DailySummary.objects.filter(company=company, date=day).update(**increments)
+
+
+def rebuild_daily_summaries(company_id=None, date_from=None, date_to=None, batch_size=1000):
+    """
+    Recompute DailySummary rows from SaleItem with one grouped query and
+    replace the existing rows of the same range. Returns the number of rows
+    written.
+    """
+    items = SaleItem.objects.filter(local_day_filter('sale__created_at', date_from, date_to))
+    items = items.annotate(day=TruncDate('sale__created_at'))
+    summaries = DailySummary.objects.all()
+    if company_id:
+        items = items.filter(sale__company_id=company_id)
+        summaries = summaries.filter(company_id=company_id)
+    if date_from:
+        summaries = summaries.filter(date__gte=date_from)
+    if date_to:
+        summaries = summaries.filter(date__lte=date_to)
+
+    rows = (
+        items.order_by()
+        .values('sale__company_id', 'day')
+        .annotate(total_sales=Sum('total_price'), total_items_sold=Sum('quantity'))
+    )
+    with transaction.atomic():
+        summaries.delete()
+        created = DailySummary.objects.bulk_create(
+            (
+                DailySummary(
+                    company_id=row['sale__company_id'],
+                    date=row['day'],
+                    total_sales=row['total_sales'] or 0,
+                    total_items_sold=row['total_items_sold'] or 0,
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=batch_size,
+        )
+    return len(created)
+
+
+def _hour_bucket(moment):
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def record_hourly_sales(company, items, sold_at):
+    """
+    Add the SaleItems of one sale to their (company, product, hour) buckets.
+
+    Call inside the sale transaction, after allocate_fifo(): the Stock row
+    locks it holds already serialize concurrent sales of the same products,
+    so the buckets can be read, updated in memory and written back with one
+    bulk_update and one bulk_create.
+    """
+    hour = _hour_bucket(sold_at)
+    totals = defaultdict(lambda: [0, 0, 0])
+    for item in items:
+        row = totals[item.product_id]
+        row[0] += item.quantity
+        row[1] += item.total_price
+        row[2] += item.total_cost
+
+    buckets = {
+        bucket.product_id: bucket
+        for bucket in ProductSalesHour.objects.select_for_update().filter(
+            company=company, hour=hour, product_id__in=totals
+        )
+    }
+    new = []
+    for product_id, (quantity, revenue, cost) in totals.items():
+        bucket = buckets.get(product_id)
+        if bucket is None:
+            new.append(ProductSalesHour(
+                company=company, product_id=product_id, hour=hour,
+                quantity=quantity, revenue=revenue, cost=cost,
+            ))
+        else:
+            bucket.quantity += quantity
+            bucket.revenue += revenue
+            bucket.cost += cost
+    ProductSalesHour.objects.bulk_update(buckets.values(), ['quantity', 'revenue', 'cost'])
+    ProductSalesHour.objects.bulk_create(new)
+
+
+def rebuild_hourly_sales(company_id=None, date_from=None, date_to=None, batch_size=1000):
+    """Recompute ProductSalesHour buckets from SaleItem; returns the number of buckets written."""
+    items = SaleItem.objects.filter(local_day_filter('sale__created_at', date_from, date_to))
+    buckets = ProductSalesHour.objects.filter(local_day_filter('hour', date_from, date_to))
+    if company_id:
+        items = items.filter(sale__company_id=company_id)
+        buckets = buckets.filter(company_id=company_id)
+
+    rows = (
+        items.annotate(hour=TruncHour('sale__created_at', tzinfo=dt_timezone.utc))
+        .order_by()
+        .values('sale__company_id', 'product_id', 'hour')
+        .annotate(quantity=Sum('quantity'), revenue=Sum('total_price'), cost=Sum('total_cost'))
+    )
+    with transaction.atomic():
+        buckets.delete()
+        created = ProductSalesHour.objects.bulk_create(
+            (
+                ProductSalesHour(
+                    company_id=row['sale__company_id'],
+                    product_id=row['product_id'],
+                    hour=row['hour'],
+                    quantity=row['quantity'] or 0,
+                    revenue=row['revenue'] or 0,
+                    cost=row['cost'] or 0,
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=batch_size,
+        )
+    return len(created)
+
+
+def product_sales_summary(company, date_from=None, date_to=None, **product_filters):
+    """
+    Units, revenue and cost of the products matching `product_filters`
+    (e.g. product_id=..., product__category_id=...) over local days
+    date_from..date_to, read from the hourly buckets.
+    """
+    buckets = ProductSalesHour.objects.filter(
+        local_day_filter('hour', date_from, date_to), company=company, **product_filters
+    )
+    totals = buckets.aggregate(quantity=Sum('quantity'), revenue=Sum('revenue'), cost=Sum('cost'))
+    return {key: value or 0 for key, value in totals.items()}
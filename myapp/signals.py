@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .dashboard import bump_dashboard_version, inventory_metrics
+from .live import has_subscribers, publish
+from .expiry import forget_expiry_days, invalidate_expiry_buckets
+from .models import Category, ExpiryPolicy, Product, Stock
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog(sender, instance, **kwargs):
+    # After commit: a read between the bump and the commit would cache the old rows under the new version
+    company_id = instance.company_id
+    transaction.on_commit(lambda: bump_catalog_version(company_id))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def invalidate_dashboard(sender, instance, **kwargs):
+    company_id = instance.company_id
+    transaction.on_commit(lambda: bump_dashboard_version(company_id))
+
+
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def invalidate_expiry(sender, instance, **kwargs):
+    company_id = instance.company_id
+    transaction.on_commit(lambda: invalidate_expiry_buckets(company_id))
+
+
+@receiver(post_save, sender=ExpiryPolicy)
+@receiver(post_delete, sender=ExpiryPolicy)
+def expiry_policy_changed(sender, instance, **kwargs):
+    company_id = instance.company_id
+
+    def forget():
+        forget_expiry_days(company_id)
+        invalidate_expiry_buckets(company_id)
+        bump_dashboard_version(company_id)
+
+    transaction.on_commit(forget)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def push_inventory(sender, instance, **kwargs):
+    # Stock changes are rare next to sales: recompute the inventory tiles once
+    # after commit and push the same values to every open dashboard.
+    company_id = instance.company_id
+    if has_subscribers(company_id):
+        transaction.on_commit(lambda: publish(company_id, 'inventory', inventory_metrics(company_id)))
@@ -1,3 +1,603 @@
-from django.test import TestCase
+import csv
+import threading
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from authentication.models import Company, CustomUser
+from . import catalog
+from .catalog_import import ImportResult, _resolve_categories, import_catalog
+from .checkout import fifo_batches, parse_basket, record_sale
+from .dates import local_day_filter, local_day_range
+from .expiry import expiring_batches, expiry_summary
+from .exports import DAILY_SUMMARY_HEADER, SALE_LINE_HEADER, STOCK_BATCH_HEADER
+from .jobs import JOBS, claim_job, run_due_jobs, schedule_now
+from .models import Category, Product, Stock, Sale, SaleItem, DailySummary, ExpiryBucket, ExpiryPolicy, Job
+from .pagination import keyset_paginate
+
+
+@override_settings(CHECKOUT_MAX_RETRIES=50, CHECKOUT_RETRY_BACKOFF=0.01)
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Parallel tills selling the same SKU must never oversell or lose stock."""
+
+    def setUp(self):
+        self.company = Company.objects.create(company_name="Test Market")
+        self.product = Product.objects.create(name="Milk", selling_price=30, company=self.company)
+        for quantity in (3, 4, 5):
+            Stock.objects.create(product=self.product, quantity=quantity, buying_price=20, company=self.company)
+        self.cashiers = [
+            CustomUser.objects.create_user(f"till{i}", password="pw", company=self.company)
+            for i in range(8)
+        ]
+
+    def _sell(self, cashier, lines, results):
+        try:
+            record_sale(self.company, cashier, lines)
+            results.append(sum(qty for _, qty in lines))
+        except ValidationError:
+            results.append(0)
+        finally:
+            connection.close()
+
+    def test_parallel_sales_never_oversell(self):
+        # Every till passes the early counter check before any of them commits
+        lines = parse_basket(self.company, [str(self.product.id)], ["2"])
+        results = []
+        threads = [
+            threading.Thread(target=self._sell, args=(cashier, lines, results))
+            for cashier in self.cashiers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sold = sum(results)
+        self.assertEqual(len(results), len(self.cashiers))
+        self.assertEqual(sold, 12)  # 12 units on hand, 8 tills asking for 2 each
+        self.assertEqual(SaleItem.objects.aggregate(total=Sum('quantity'))['total'], sold)
+        self.assertEqual(DailySummary.objects.get(company=self.company).total_items_sold, sold)
+
+        self.product.refresh_from_db()
+        remaining = Stock.objects.filter(product=self.product).aggregate(total=Sum('quantity'))['total']
+        self.assertEqual(remaining, 0)
+        self.assertEqual(self.product.stock_on_hand, remaining)
+
+
+class ProductSaveTests(TestCase):
+    """Saving a product edit must not write back a stale on-hand counter."""
+
+    def test_edit_does_not_undo_a_concurrent_sale(self):
+        company = Company.objects.create(company_name="Test Market")
+        product = Product.objects.create(name="Milk", selling_price=30, company=company)
+        Stock.objects.create(product=product, quantity=10, buying_price=20, company=company)
+
+        editing = Product.objects.get(pk=product.pk)  # the edit form loads 10 on hand
+        record_sale(company, None, parse_basket(company, [str(product.id)], ["4"]))
+        editing.selling_price = 35
+        editing.save()
+
+        product.refresh_from_db()
+        self.assertEqual(product.selling_price, 35)
+        self.assertEqual(product.stock_on_hand, 6)
+        self.assertEqual(Stock.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'], 6)
+
+
+class IndexUsageTests(TestCase):
+    """The hot tenant queries must be index range scans, not full scans of the company's rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.companies = [Company.objects.create(company_name=f"Market {i}") for i in range(3)]
+        cls.company = cls.companies[0]
+        cls.cashier = CustomUser.objects.create_user("till", password="pw", company=cls.company)
+        today = timezone.localdate()
+        for company in cls.companies:
+            for i in range(20):
+                product = Product.objects.create(name=f"Item {i}", selling_price=10, company=company)
+                Stock.objects.create(
+                    product=product, quantity=i % 3, buying_price=5, company=company,
+                    expiry_date=today + timedelta(days=i * 10),
+                )
+                sale = Sale.objects.create(company=company, sold_by=cls.cashier, total_price=10)
+                SaleItem.objects.create(company=company, sale=sale, product=product, quantity=1, selling_price=10)
+        cls.product = product
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"{index_name} not used:\n{plan}")
+
+    def test_near_expiry(self):
+        self.assertUsesIndex(expiring_batches(self.company.pk), 'stock_company_expiry_qty_idx')
+
+    def test_fifo_batches(self):
+        self.assertUsesIndex(fifo_batches([self.product.id]), 'stock_fifo_idx')
+
+    def test_sales_history(self):
+        start, end = local_day_range(timezone.localdate(), timezone.localdate())
+        self.assertUsesIndex(
+            Sale.objects.filter(company=self.company, created_at__gte=start, created_at__lt=end)
+            .order_by('-created_at', '-id'),
+            'sale_company_created_idx',
+        )
+        self.assertUsesIndex(
+            Sale.objects.filter(sold_by=self.cashier, created_at__gte=start, created_at__lt=end),
+            'sale_sold_by_created_idx',
+        )
+
+    def test_sale_items(self):
+        sale = Sale.objects.filter(company=self.company).first()
+        self.assertUsesIndex(SaleItem.objects.filter(company=self.company, sale=sale), 'saleitem_company_sale_idx')
+
+    def test_product_list(self):
+        self.assertUsesIndex(
+            Product.objects.filter(company=self.company).order_by('name'), 'product_company_name_idx'
+        )
+
+
+class LocalDayFilterTests(TestCase):
+    """Local (Africa/Addis_Ababa, UTC+3) days map to half-open UTC ranges on created_at."""
+
+    def test_sale_just_before_local_midnight_belongs_to_that_day(self):
+        company = Company.objects.create(company_name="Test Market")
+        day = date(2026, 3, 1)
+        late = Sale.objects.create(company=company)
+        early = Sale.objects.create(company=company)
+        # 23:30 local on the 1st and 00:30 local on the 2nd, i.e. 20:30 and 21:30 UTC
+        Sale.objects.filter(pk=late.pk).update(created_at=datetime(2026, 3, 1, 20, 30, tzinfo=dt_timezone.utc))
+        Sale.objects.filter(pk=early.pk).update(created_at=datetime(2026, 3, 1, 21, 30, tzinfo=dt_timezone.utc))
+
+        in_day = Sale.objects.filter(local_day_filter('created_at', day, day))
+        self.assertEqual(list(in_day.values_list('pk', flat=True)), [late.pk])
+        self.assertEqual(Sale.objects.filter(local_day_filter('created_at', date_from=day)).count(), 2)
+
+        # The column is compared as is, no DATE()/CONVERT_TZ() wrapped around it
+        sql = str(Sale.objects.filter(local_day_filter('created_at', '2026-03-01', '2026-03-01')).query).upper()
+        self.assertNotIn('DATE(', sql)
+        self.assertNotIn('CONVERT_TZ', sql)
+
+
+class CatalogSearchTests(TestCase):
+    """Search serves a per-process snapshot that catalog writes invalidate once they commit."""
+
+    def setUp(self):
+        cache.clear()
+        catalog._snapshots.clear()
+        self.company = Company.objects.create(company_name="Test Market")
+        self.milk = Product.objects.create(name="Milk", barcode="100", selling_price=30, company=self.company)
+        self.client.force_login(CustomUser.objects.create_user("till", password="pw", company=self.company))
+
+    def search(self, q):
+        response = self.client.get('/api/products/search/', {'q': q})
+        return [(row['name'], row['selling_price'], row['quantity']) for row in response.json()]
+
+    def test_writes_show_after_commit(self):
+        self.assertEqual(self.search("mil"), [("Milk", "30.00", 0)])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.milk.name = "Fresh Milk"
+            self.milk.save()
+        # Not committed yet: the snapshot still holds the old name
+        self.assertEqual(self.search("mil"), [("Milk", "30.00", 0)])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.search("fresh"), [("Fresh Milk", "30.00", 0)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.milk.selling_price = 32
+            self.milk.save()
+        self.assertEqual(self.search("100"), [("Fresh Milk", "32.00", 0)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Stock.objects.create(product=self.milk, quantity=6, buying_price=20, company=self.company)
+        self.assertEqual(self.search("fresh"), [("Fresh Milk", "32.00", 6)])
+
+
+class BarcodeLookupTests(TestCase):
+    """A scanner's repeated lookup of an unchanged product is answered with 304 Not Modified."""
+
+    def test_etag(self):
+        company = Company.objects.create(company_name="Test Market")
+        milk = Product.objects.create(name="Milk", barcode="100", selling_price=30, company=company)
+        self.client.force_login(CustomUser.objects.create_user("till", password="pw", company=company))
+
+        response = self.client.get('/api/products/barcode/100/')
+        self.assertEqual(response.json()['name'], "Milk")
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get('/api/products/barcode/100/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('private', response['Cache-Control'])
+
+        milk.selling_price = 32
+        milk.save()
+        response = self.client.get('/api/products/barcode/100/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['selling_price'], "32.00")
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages on (created_at, id) never repeat or skip a sale, even among equal timestamps."""
+
+    def setUp(self):
+        company = Company.objects.create(company_name="Test Market")
+        noon = timezone.make_aware(datetime(2030, 1, 1, 12))
+        for minutes in (0, 5, 5, 5, 9):
+            sale = Sale.objects.create(company=company)
+            Sale.objects.filter(pk=sale.pk).update(created_at=noon + timedelta(minutes=minutes))
+        self.sales = Sale.objects.filter(company=company)
+        self.newest_first = list(self.sales.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def page(self, query=''):
+        return keyset_paginate(self.sales, RequestFactory().get(f'/sales/?{query}'), 2)
+
+    def test_after_and_before_cursors(self):
+        pages = [self.page()]
+        while pages[-1].has_next:
+            pages.append(self.page(pages[-1].next_query))
+        self.assertEqual([[sale.id for sale in page] for page in pages], [
+            self.newest_first[0:2], self.newest_first[2:4], self.newest_first[4:5],
+        ])
+        self.assertEqual([page.has_previous for page in pages], [False, True, True])
+
+        back = self.page(pages[2].previous_query)
+        self.assertEqual([sale.id for sale in back], self.newest_first[2:4])
+        back = self.page(back.previous_query)
+        self.assertEqual([sale.id for sale in back], self.newest_first[0:2])
+        self.assertFalse(back.has_previous)
+
+    def test_malformed_cursor_is_the_first_page(self):
+        for query in ('after=yesterday', 'after=2030-01-01T12:05:00%7Cx', 'before=%7C3'):
+            self.assertEqual([sale.id for sale in self.page(query)], self.newest_first[0:2])
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTests(TestCase):
+    """The CSV exports stream every row of the company, across several keyset slices, and nothing else."""
+
+    def setUp(self):
+        self.company, other = (Company.objects.create(company_name=name) for name in ("Test Market", "Other"))
+        today = timezone.localdate()
+        for company, count in ((self.company, 5), (other, 1)):
+            product = Product.objects.create(name="Milk", barcode="100", selling_price=30, company=company)
+            sale = Sale.objects.create(company=company)
+            for i in range(count):
+                Stock.objects.create(product=product, quantity=1, buying_price=20, company=company)
+                SaleItem.objects.create(company=company, sale=sale, product=product, quantity=1, selling_price=30)
+                DailySummary.objects.create(company=company, date=today - timedelta(days=i), total_sales=30)
+        self.client.force_login(
+            CustomUser.objects.create_user("admin", password="pw", user_type='admin', company=self.company)
+        )
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_sales(self):
+        rows = self.export('/sales/export/')
+        self.assertEqual(rows[0], SALE_LINE_HEADER)
+        self.assertEqual(len(rows) - 1, 5)
+        self.assertEqual(
+            set(int(row[0]) for row in rows[1:]),
+            set(SaleItem.objects.filter(company=self.company).values_list('id', flat=True)),
+        )
+
+    def test_stock(self):
+        rows = self.export('/stock/export/')
+        self.assertEqual(rows[0], STOCK_BATCH_HEADER)
+        self.assertEqual(
+            [int(row[0]) for row in rows[1:]],
+            list(Stock.objects.filter(company=self.company).order_by('pk').values_list('id', flat=True)),
+        )
+
+    def test_daily_summaries(self):
+        rows = self.export('/daily-summaries/export/')
+        self.assertEqual(rows[0], DAILY_SUMMARY_HEADER)
+        self.assertEqual(
+            [row[0] for row in rows[1:]],
+            [str(timezone.localdate() - timedelta(days=i)) for i in range(4, -1, -1)],
+        )
+
+
+class ExpiryBucketTests(TestCase):
+    """Batches land in exactly one bucket of the company's windows; sold-out batches in none."""
+
+    def setUp(self):
+        self.company = Company.objects.create(company_name="Test Market")
+        self.product = Product.objects.create(name="Yogurt", selling_price=30, company=self.company)
+        today = timezone.localdate()
+        for days, quantity in ((-1, 2), (0, 3), (7, 4), (8, 5), (30, 6), (90, 7), (91, 8), (3, 0)):
+            Stock.objects.create(
+                product=self.product, quantity=quantity, buying_price=10, company=self.company,
+                expiry_date=today + timedelta(days=days),
+            )
+
+    def test_default_windows(self):
+        rows = expiry_summary(self.company.pk)
+        self.assertEqual([row.bucket for row in rows], [b for b, _ in ExpiryBucket.BUCKET_CHOICES])
+        self.assertEqual([row.units for row in rows], [2, 3 + 4, 5 + 6, 7])
+        self.assertEqual(rows[0].stock_value, 20)
+
+    def test_stock_write_and_policy_change_invalidate(self):
+        expiry_summary(self.company.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            Stock.objects.create(
+                product=self.product, quantity=1, buying_price=10, company=self.company,
+                expiry_date=timezone.localdate() - timedelta(days=5),
+            )
+        self.assertEqual(expiry_summary(self.company.pk)[0].units, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ExpiryPolicy.objects.create(company=self.company, critical_days=1, warning_days=8, watch_days=91)
+        self.assertEqual([row.units for row in expiry_summary(self.company.pk)], [3, 3, 4 + 5, 6 + 7 + 8])
+
+    def test_partial_sale_updates_units(self):
+        self.assertEqual(expiry_summary(self.company.pk)[0].units, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_sale(self.company, None, parse_basket(self.company, [str(self.product.id)], ["1"]))
+        self.assertEqual(expiry_summary(self.company.pk)[0].units, 1)
+
+    def test_sale_emptying_a_batch_pushes_expiry_tiles(self):
+        with mock.patch('myapp.checkout.has_subscribers', return_value=True), \
+                mock.patch('myapp.checkout.publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                # FIFO: the two units of the expired batch go first
+                record_sale(self.company, None, parse_basket(self.company, [str(self.product.id)], ["2"]))
+        published = {event: data for _, event, data in (c.args for c in publish.call_args_list)}
+        self.assertEqual(published['inventory'], {'expired_count': 0, 'near_expiry_count': 5})
+        self.assertEqual(published['delta']['today_total_quantity'], 2)
+
+    def test_rows_of_other_windows_are_recomputed(self):
+        expiry_summary(self.company.pk)
+        # Written by a process that still had the previous windows
+        ExpiryBucket.objects.filter(company=self.company, bucket=ExpiryBucket.CRITICAL).update(max_days=3, units=0)
+        self.assertEqual(expiry_summary(self.company.pk)[1].units, 7)
+
+
+class JobTests(TestCase):
+    """A due job is claimed by one worker only, and a failed run is retried before its next slot."""
+
+    def test_only_one_worker_claims_a_due_job(self):
+        schedule_now('clear_sessions')
+        self.assertTrue(claim_job('clear_sessions', 'worker-a'))
+        self.assertFalse(claim_job('clear_sessions', 'worker-b'))
+        # Once the lease lapses (the worker died), another worker takes over
+        Job.objects.filter(name='clear_sessions').update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(claim_job('clear_sessions', 'worker-b'))
+
+    def test_run_reschedules_and_records_failures(self):
+        schedule_now('refresh_expiry')
+        ran = run_due_jobs('worker-a')
+        self.assertEqual([name for name, _, _ in ran], ['refresh_expiry'])
+        job = Job.objects.get(name='refresh_expiry')
+        self.assertEqual((job.locked_by, job.failures, job.last_error), ('', 0, ''))
+        self.assertGreater(job.next_run_at, timezone.now())
+        self.assertEqual(run_due_jobs('worker-a'), [])
+
+        schedule_now('refresh_expiry')
+        with mock.patch.object(JOBS['refresh_expiry'], 'func', side_effect=RuntimeError("disk full")):
+            run_due_jobs('worker-a')
+        job.refresh_from_db()
+        self.assertEqual(job.failures, 1)
+        self.assertIn("disk full", job.last_error)
+        self.assertLessEqual(job.next_run_at, timezone.now() + timedelta(minutes=5))
+
+
+class SaleSyncTests(TestCase):
+    """A till's queued sales are recorded once per key, however often the batch is sent."""
+
+    def setUp(self):
+        self.company = Company.objects.create(company_name="Test Market")
+        self.product = Product.objects.create(name="Bread", selling_price=15, company=self.company)
+        Stock.objects.create(product=self.product, quantity=5, buying_price=10, company=self.company)
+        self.client.force_login(
+            CustomUser.objects.create_user("till", password="pw", user_type='cashier', company=self.company)
+        )
+
+    def sync(self, sales):
+        response = self.client.post('/api/sales/sync/', {'sales': sales}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return [(r['key'], r['status']) for r in response.json()['results']]
+
+    def test_batch_is_recorded_once(self):
+        sales = [
+            {'key': 'a', 'items': [{'product_id': self.product.id, 'quantity': 2}]},
+            {'key': 'b', 'items': [{'product_id': self.product.id, 'quantity': 9}]},
+            {'key': 'a', 'items': [{'product_id': self.product.id, 'quantity': 2}]},
+            {'key': 'c', 'items': [{'product_id': self.product.id, 'quantity': 3}]},
+        ]
+        self.assertEqual(
+            self.sync(sales), [('a', 'created'), ('b', 'rejected'), ('a', 'duplicate'), ('c', 'created')]
+        )
+        # The response was lost and the till sends the same batch again
+        self.assertEqual(
+            self.sync(sales), [('a', 'duplicate'), ('b', 'rejected'), ('a', 'duplicate'), ('c', 'duplicate')]
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_on_hand, 0)
+        self.assertEqual(Sale.objects.filter(company=self.company).count(), 2)
+
+    def test_bad_sale_is_rejected_alone(self):
+        sales = [
+            {'key': 'a', 'items': [{'product_id': 'x', 'quantity': 1}]},
+            {'key': 'b', 'items': [{'product_id': self.product.id, 'quantity': 2.7}]},
+            {'key': 'c', 'items': [{'product_id': self.product.id, 'quantity': 1}], 'queued_at': 'soon'},
+            {'key': 'd', 'items': [{'product_id': self.product.id, 'quantity': 1}]},
+        ]
+        self.assertEqual(
+            self.sync(sales), [('a', 'rejected'), ('b', 'rejected'), ('c', 'rejected'), ('d', 'created')]
+        )
+
+    def test_other_integrity_error_rejects_that_sale(self):
+        sales = [
+            {'key': 'a', 'items': [{'product_id': self.product.id, 'quantity': 1}]},
+            {'key': 'b', 'items': [{'product_id': self.product.id, 'quantity': 1}]},
+        ]
+        # Not a duplicate key: no sale exists for 'a' after its savepoint rolled back
+        with mock.patch('myapp.checkout.record_hourly_sales', side_effect=[IntegrityError("check failed"), None]):
+            self.assertEqual(self.sync(sales), [('a', 'rejected'), ('b', 'created')])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_on_hand, 4)
+
+    def test_queued_before_midnight_counts_for_that_day(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        queued_at = timezone.make_aware(datetime.combine(yesterday, datetime.min.time().replace(hour=23, minute=50)))
+        sales = [{'key': 'a', 'items': [{'product_id': self.product.id, 'quantity': 1}], 'queued_at': queued_at.isoformat()}]
+        self.assertEqual(self.sync(sales), [('a', 'created')])
+        self.assertEqual(Sale.objects.get(idempotency_key='a').created_at, queued_at)
+        self.assertEqual(DailySummary.objects.get(company=self.company).date, yesterday)
+
+        # A till clock far in the past is clamped to SALE_SYNC_MAX_AGE
+        sales = [{'key': 'b', 'items': [{'product_id': self.product.id, 'quantity': 1}], 'queued_at': '2001-01-01T00:00:00Z'}]
+        self.sync(sales)
+        self.assertGreater(Sale.objects.get(idempotency_key='b').created_at, timezone.now() - timedelta(days=3))
+
+    def test_malformed_batch(self):
+        response = self.client.post('/api/sales/sync/', {'sales': {}}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/sales/sync/', 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SaleReplayTests(TestCase):
+    """Submitting the same sale form twice records one sale and deducts stock once."""
+
+    def test_double_submit(self):
+        company = Company.objects.create(company_name="Test Market")
+        product = Product.objects.create(name="Tea", selling_price=20, company=company)
+        Stock.objects.create(product=product, quantity=3, buying_price=12, company=company)
+        self.client.force_login(CustomUser.objects.create_user("admin", password="pw", user_type='admin', company=company))
+
+        key = self.client.get('/add-sale/').context['idempotency_key']
+        form = {'product_id[]': [str(product.id)], 'quantity[]': ['2'], 'idempotency_key': key}
+        for _ in range(2):
+            # The replay is answered like the original, though only 1 unit is left
+            self.assertRedirects(self.client.post('/add-sale/', form), '/sales/', fetch_redirect_response=False)
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock_on_hand, 1)
+        self.assertEqual(Sale.objects.filter(company=company, idempotency_key=key).count(), 1)
+        self.assertNotEqual(self.client.get('/add-sale/').context['idempotency_key'], key)
+
+
+class StockLevelsTests(TestCase):
+    """The basket revalidation endpoint sums the company's batches per product."""
+
+    def test_levels(self):
+        company, other = (Company.objects.create(company_name=name) for name in ("Test Market", "Other"))
+        milk = Product.objects.create(name="Milk", selling_price=30, company=company)
+        salt = Product.objects.create(name="Salt", selling_price=5, company=company)
+        foreign = Product.objects.create(name="Rice", selling_price=50, company=other)
+        for product, quantity in ((milk, 3), (milk, 4), (salt, 0), (foreign, 9)):
+            Stock.objects.create(product=product, quantity=quantity, buying_price=1, company=product.company)
+        self.client.force_login(CustomUser.objects.create_user("till", password="pw", company=company))
+
+        response = self.client.get('/api/products/stock/', {'ids': f"{milk.id},{salt.id},{foreign.id}"})
+        self.assertEqual(response.json(), {str(milk.id): 7, str(salt.id): 0, str(foreign.id): 0})
+        self.assertEqual(self.client.get('/api/products/stock/', {'ids': "1,x"}).status_code, 400)
+
+
+class CatalogImportTests(TestCase):
+    """An import upserts on (company, barcode) and skips bad rows without stopping."""
+
+    def test_upsert_and_row_errors(self):
+        company = Company.objects.create(company_name="Test Market")
+        existing = Product.objects.create(name="Milk", barcode="100", selling_price=30, company=company)
+        Stock.objects.create(product=existing, quantity=5, buying_price=20, company=company)
+
+        rows = [
+            {'name': 'Milk 1L', 'category': 'Dairy', 'barcode': '100', 'selling_price': '32.50'},
+            {'name': 'Bread', 'category': 'Bakery', 'barcode': '200', 'selling_price': 'NaN'},
+            {'name': 'Bread', 'category': 'Bakery', 'barcode': '200', 'selling_price': '100000000'},
+            {'name': '', 'category': 'Bakery', 'barcode': '300', 'selling_price': '5'},
+            {'name': 'Salt', 'category': 'Dairy', 'barcode': '400', 'selling_price': '8', 'low_stock_threshold': '3'},
+            {'name': 'Sugar', 'category': 'Dairy', 'barcode': '500', 'selling_price': '9',
+             'low_stock_threshold': '10000000000'},
+        ]
+        result = import_catalog(company, rows, batch_size=2)
+
+        self.assertEqual(result.imported, 2)
+        self.assertEqual([line for line, _ in result.errors], [3, 4, 5, 7])
+        self.assertEqual(result.categories_created, 1)
+        existing.refresh_from_db()
+        self.assertEqual((existing.name, existing.selling_price, existing.category.name), ("Milk 1L", 32.5, "Dairy"))
+        self.assertEqual(existing.stock_on_hand, 5)
+        self.assertEqual(Product.objects.get(company=company, barcode="400").low_stock_threshold, 3)
+        self.assertEqual(Category.objects.filter(company=company).count(), 1)
+
+    def test_categories_created_elsewhere_are_not_counted(self):
+        company = Company.objects.create(company_name="Test Market")
+        Category.objects.create(company=company, name="Dairy")
+        result, categories = ImportResult(), {}
+        real_filter = Category.objects.filter
+        calls = []
+
+        def filter_missing_first(*args, **kwargs):
+            # The first lookup misses "Dairy", as when another import creates it right after
+            calls.append(args)
+            return Category.objects.none() if len(calls) == 1 else real_filter(*args, **kwargs)
+
+        with mock.patch.object(Category.objects, 'filter', side_effect=filter_missing_first):
+            _resolve_categories(company, {"Dairy", "Bakery"}, categories, result)
+
+        self.assertEqual(result.categories_created, 1)
+        self.assertEqual(set(categories), {"Dairy", "Bakery"})
+
+
+class ReceiveStockTests(TestCase):
+    """A CSV delivery books its batches, the on-hand counters and new prices in one go."""
+
+    def setUp(self):
+        self.company = Company.objects.create(company_name="Test Market")
+        self.milk = Product.objects.create(name="Milk", barcode="100", selling_price=30, company=self.company)
+        self.salt = Product.objects.create(name="Salt", barcode="200", selling_price=5, company=self.company)
+        Stock.objects.create(product=self.milk, quantity=2, buying_price=20, company=self.company)
+        self.client.force_login(
+            CustomUser.objects.create_user("admin", password="pw", user_type='admin', company=self.company)
+        )
+
+    def receive(self, csv_text):
+        upload = SimpleUploadedFile("delivery.csv", csv_text.encode(), content_type="text/csv")
+        return self.client.post('/receive-stock/', {'file': upload})
+
+    def test_csv_delivery(self):
+        response = self.receive(
+            "barcode,quantity,buying_price,selling_price,expiry_date\n"
+            "100,10,21.50,,2030-01-31\n"
+            "\n"
+            "200,4,3,6.25,\n"
+            "100,5,22,35,\n"
+        )
+        self.assertRedirects(response, '/receive-stock/', fetch_redirect_response=False)
+
+        self.milk.refresh_from_db()
+        self.salt.refresh_from_db()
+        self.assertEqual((self.milk.stock_on_hand, self.milk.selling_price), (17, 35))
+        self.assertEqual((self.salt.stock_on_hand, self.salt.selling_price), (4, 6.25))
+        self.assertEqual(
+            sorted(Stock.objects.filter(product=self.milk).values_list('quantity', 'expiry_date')),
+            [(2, None), (5, None), (10, date(2030, 1, 31))],
+        )
+
+    def test_bad_rows_book_nothing(self):
+        response = self.receive(
+            "barcode,quantity,buying_price\n100,1,NaN\n200,1,1e9\n999,1,2\n100,10000000000,2\n"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [str(m).split(':')[0] for m in response.context['messages']], ["Row 1", "Row 2", "Row 3", "Row 4"]
+        )
+        self.assertEqual(Stock.objects.count(), 1)
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.stock_on_hand, 2)
@@ -1,15 +1,26 @@
 from django.urls import path
-from . import views
+from . import api, views
 urlpatterns = [
     path('', views.login, name='login'),
     path('products/', views.product_list, name='products'),
     path('add-product/', views.add_product, name='add_product'),
+    path('products/import/', views.import_products, name='import_products'),
     path('add-stock/', views.add_stock, name='add_stock'),
+    path('receive-stock/', views.receive_stock, name='receive_stock'),
     path('add-sale/', views.add_sale, name='add_sale'),
     path('cashier_add_sale/', views.cashier_add_sale, name='cashier_add_sale'),
+    path('api/sales/sync/', views.sync_sales, name='sync_sales'),
     path('sales/', views.sales, name='sales'),
     path('cashier_sales/', views.cashier_sales, name='cashier_sales'),
-    path('api/products/search/', views.product_search, name='product_search'),  # <-- this is needed
+    path('sales/export/', views.export_sales, name='export_sales'),
+    path('stock/export/', views.export_stock, name='export_stock'),
+    path('daily-summaries/export/', views.export_daily_summaries, name='export_daily_summaries'),
+    path('api/products/search/', api.product_search, name='product_search'),  # <-- this is needed
+    path('api/products/barcode/<str:barcode>/', api.product_by_barcode, name='product_by_barcode'),
+    path('api/products/<int:product_id>/batches/', api.product_batches, name='api_product_batches'),
+    path('api/products/stock/', api.stock_levels, name='api_stock_levels'),
+    path('api/dashboard/metrics/', api.dashboard_metrics, name='api_dashboard_metrics'),
+    path('api/dashboard/stream/', api.dashboard_stream, name='dashboard_stream'),
     path('expired/', views.expired_list, name='expired_list'),
     path('near_expiry_stocks/', views.near_expiry_stocks, name='near_expiry_stocks'),
     path('stock_deatil/<int:stock_id>/', views.stock_deatil, name='stock_deatil'),    
@@ -1,13 +1,30 @@
+import csv
+import io
+import json
+import uuid
 from django.contrib.auth.decorators import login_required, user_passes_test
-from datetime import date, timedelta
+from datetime import date
 from django.http import JsonResponse
 from .models import Product, Stock, Sale, DailySummary, SaleItem,Category
 from .forms import ProductForm, StockForm, SaleForm
-from django.db.models import Sum, Prefetch, Q
+from .checkout import parse_sale_batch, record_sale_batch, submit_sale
+from .pagination import keyset_paginate
+from .catalog_import import import_catalog
+from .receiving import rows_from_csv, rows_from_post, parse_delivery, book_delivery
+from .reports import annotate_sale_totals, attach_product_names, filter_sales
+from .exports import (
+    csv_response, sale_line_rows, stock_batch_rows, daily_summary_rows,
+    SALE_LINE_HEADER, STOCK_BATCH_HEADER, DAILY_SUMMARY_HEADER,
+)
+from .rollups import product_sales_summary
+from .dates import local_day_filter
+from .expiry import expired_batches, expiring_batches, expiry_counts, expiry_days, expiry_summary
+from django.core.exceptions import ValidationError
+from django.db.models import Sum, Q, F, Exists, OuterRef
 from django.core.paginator import Paginator
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.db import transaction
+from django.views.decorators.http import require_POST
 from authentication.views import is_admin, is_cashier
 from authentication.models import CustomUser
 from authentication.forms import UserForm, UserUpdateForm
@@ -20,13 +37,11 @@ def dashboard(request):
     company = current_user.company
     total_products = Product.objects.count()
     today = date.today()
-    todays_sales = Sale.objects.filter(created_at__date=today, company=company).count()
+    todays_sales = Sale.objects.filter(local_day_filter('created_at', today, today), company=company).count()
     low_stock_count = Product.objects.filter(quantity__lte=5,  company=company).count()
 
-    near_expiry_limit = today + timedelta(days=7)
-    expired_count = Product.objects.filter(expiry_date__lt=today,  company=company).count()
-    near_expiry_count = Product.objects.filter(expiry_date__range=[today, near_expiry_limit],  company=company).count()
-    expired_total = expired_count + near_expiry_count
+    expiry = expiry_counts(expiry_summary(company.pk))
+    expired_total = expiry['expired_count'] + expiry['near_expiry_count']
 
     context = {
         'total_products': total_products,
@@ -47,7 +62,7 @@ def product_list(request):
     category = request.GET.get('category')
     filter_type = request.GET.get('filter')  # low_stock | near_expiry
 
-    products = Product.objects.filter( company=company).order_by('name')
+    products = Product.objects.filter( company=company).select_related('category').order_by('name')
 
     # -------------------------------------
     # SEARCH
@@ -69,21 +84,19 @@ def product_list(request):
     # LOW STOCK FILTER
     # -------------------------------------
     if filter_type == "low_stock":
-        products = [p for p in products if p.low_stock]
+        products = products.filter(stock_on_hand__lte=F('low_stock_threshold'))
 
     # -------------------------------------
-    # NEAR EXPIRY FILTER (within 90 days)
+    # NEAR EXPIRY FILTER (expired or inside the company's widest window)
     # -------------------------------------
     elif filter_type == "near_expiry":
-        threshold_date = date.today() + timedelta(days=90)
+        products = products.filter(
+            Exists(expiring_batches(company.pk, include_expired=True).filter(product=OuterRef('pk')))
+        )
 
-        filtered = []
-        for product in products:
-            for batch in product.batches.filter(company=company):
-                if batch.expiry_date and batch.expiry_date <= threshold_date:
-                    filtered.append(product)
-                    break
-        products = filtered
+    products = products.annotate(
+        is_expired=Exists(expired_batches(company.pk).filter(product=OuterRef('pk')))
+    )
 
     # -------------------------------------
     # PAGINATION
@@ -125,36 +138,12 @@ def add_category(request):
 def expired_list(request):
     current_user = request.user
     company = current_user.company
-    today = date.today()
-    near_expiry_limit = today + timedelta(days=7)
-    expired = Product.objects.filter(expiry_date__lt=today, company=company)
-    near_expiry = Product.objects.filter(expiry_date__range=[today, near_expiry_limit], company=company)
-    return render(request, 'expired.html', {'expired': expired, 'near_expiry': near_expiry})
-@login_required(login_url='/accounts/login')
-def product_search(request):
-    current_user = request.user
-    company = current_user.company
-    q = request.GET.get("q", "")
-
-    products = Product.objects.filter(
-        Q(name__icontains=q) |
-        Q(barcode__icontains=q) |
-        Q(category__name__icontains=q), 
-        company=company
-    )
-
-    data = []
-    for p in products:
-        data.append({
-            "id": p.id,
-            "name": p.name,
-            "barcode": p.barcode,
-            "category": p.category.name if p.category else "",
-            "selling_price": p.selling_price,
-            "quantity": p.total_stock,
-        })
-
-    return JsonResponse(data, safe=False)
+    context = {
+        'title': "Expired Stock Batches",
+        'near_expiry_batches': expired_batches(company.pk).select_related('product').order_by('expiry_date'),
+        'empty_message': "No expired stock.",
+    }
+    return render(request, 'near_expiry_stocks.html', context)
 @login_required
 def add_product(request):
     if request.method == 'POST':
@@ -172,6 +161,23 @@ def add_product(request):
 
 @login_required(login_url='/accounts/login')
 @user_passes_test(is_admin)
+def import_products(request):
+    """Upload a CSV of products (see import_catalog) into the user's company catalog."""
+    if request.method == 'POST' and request.FILES.get('file'):
+        rows = csv.DictReader(io.TextIOWrapper(request.FILES['file'].file, encoding='utf-8-sig', newline=''))
+        result = import_catalog(request.user.company, rows)
+        for line, message in result.errors[:50]:
+            messages.error(request, f"Line {line}: {message}")
+        if len(result.errors) > 50:
+            messages.error(request, f"... and {len(result.errors) - 50} more rows with errors.")
+        messages.success(
+            request,
+            f"Imported {result.imported} product(s), new categories: {result.categories_created}.",
+        )
+        return redirect('import_products')
+    return render(request, 'import_products.html')
+@login_required(login_url='/accounts/login')
+@user_passes_test(is_admin)
 def add_stock(request):
     if request.method == 'POST':
         product_id = request.POST.get('product_id')
@@ -198,7 +204,7 @@ def add_stock(request):
             return redirect('add_stock')
 
         # Get product
-        product = get_object_or_404(Product, id=product_id)
+        product = get_object_or_404(Product, id=product_id, company=request.user.company)
 
         # Update product selling price if changed
         if product.selling_price != selling_price:
@@ -210,6 +216,7 @@ def add_stock(request):
 
         # Create stock batch
         stock = Stock.objects.create(
+            company=product.company,
             product=product,
             quantity=quantity,
             buying_price=buying_price,
@@ -222,6 +229,29 @@ def add_stock(request):
     return render(request, 'add_stock.html')
 @login_required(login_url='/accounts/login')
 @user_passes_test(is_admin)
+def receive_stock(request):
+    """A whole delivery in one request, typed row by row or uploaded as a CSV."""
+    rows = []
+    if request.method == 'POST':
+        company = request.user.company
+        try:
+            if request.FILES.get('file'):
+                rows = rows_from_csv(request.FILES['file'])
+            else:
+                rows = rows_from_post(request.POST)
+            batches = book_delivery(company, parse_delivery(company, rows))
+        except ValidationError as e:
+            for error in e.messages:
+                messages.error(request, error)
+            # Re-render so the typed rows are not lost
+            return render(request, 'receive_stock.html', {'rows': rows})
+
+        units = sum(batch.quantity for batch in batches)
+        messages.success(request, f"Received {len(batches)} batch(es), {units} units in total.")
+        return redirect('receive_stock')
+    return render(request, 'receive_stock.html', {'rows': rows})
+@login_required(login_url='/accounts/login')
+@user_passes_test(is_admin)
 def edit_product(request, product_id):
     # Ensure the product belongs to the user's company
     product = get_object_or_404(Product, id=product_id, company=request.user.company)
@@ -252,91 +282,21 @@ def add_sale(request):
     current_user = request.user
     company = current_user.company
     if request.method == 'POST':
-        product_ids = request.POST.getlist('product_id[]')
-        quantities = request.POST.getlist('quantity[]')
-
-        if not product_ids or not quantities:
-            messages.error(request, "No products selected.")
-            return redirect('add_sale')
-
-        # Convert quantities to integers
         try:
-            quantities = [int(q) for q in quantities]
-        except (ValueError, TypeError):
-            messages.error(request, "Invalid quantity entered.")
+            sale = submit_sale(
+                company, current_user,
+                request.POST.getlist('product_id[]'), request.POST.getlist('quantity[]'),
+                request.POST.get('idempotency_key') or None,
+            )
+        except ValidationError as e:
+            messages.error(request, " | ".join(e.messages))
             return redirect('add_sale')
 
-        # Validate stock for all selected products
-        products = Product.objects.filter(id__in=product_ids, company=company)
-        product_map = {str(p.id): p for p in products}
-        stock_errors = []
-
-        for pid, qty in zip(product_ids, quantities):
-            product = product_map.get(pid)
-            if not product:
-                stock_errors.append(f"Product with ID {pid} not found.")
-            elif qty <= 0:
-                stock_errors.append(f"Quantity for {product.name} must be at least 1.")
-            elif product.total_stock < qty:
-                stock_errors.append(f"Not enough stock for {product.name}. Available: {product.total_stock}")
-
-        if stock_errors:
-            messages.error(request, " | ".join(stock_errors))
-            return redirect('add_sale')
+        messages.success(request, f"Sale recorded successfully! Grand Total: {sale.total_price:.2f} Birr")
+        return redirect('sales')
 
-        # All validations passed, save sale
-        with transaction.atomic():
-            sale = Sale.objects.create(total_price=0, company=company)
-            grand_total = 0
-
-            for pid, qty in zip(product_ids, quantities):
-                product = product_map[pid]
-
-                # Deduct stock using FIFO
-                remaining = qty
-                batches = product.batches.filter(quantity__gt=0).order_by('added_at')
-                for batch in batches:
-                    if remaining == 0:
-                        break
-                    if batch.quantity >= remaining:
-                        batch.quantity -= remaining
-                        batch.save()
-                        remaining = 0
-                    else:
-                        remaining -= batch.quantity
-                        batch.quantity = 0
-                        batch.save()
-
-                # Compute item total
-                total_price = qty * product.selling_price
-                grand_total += total_price
-
-                # Create SaleItem
-                SaleItem.objects.create(
-                    company=company,
-                    sale=sale,
-                    product=product,
-                    quantity=qty,
-                    selling_price=product.selling_price,
-                    total_price=total_price, 
-                )
-
-            # Update Sale grand total
-            sale.total_price = grand_total
-            sale.sold_by = request.user
-
-            sale.save()
-
-            # Update daily summary
-            ds, created = DailySummary.objects.get_or_create(date=date.today())
-            ds.total_sales += grand_total
-            ds.total_items_sold += sum(quantities)
-            ds.save()
-
-            messages.success(request, f"Sale recorded successfully! Grand Total: {grand_total:.2f} Birr")
-            return redirect('sales')
-
-    return render(request, 'add_sale.html')
+    # A fresh key per rendered form: resubmitting the same form replays its sale
+    return render(request, 'add_sale.html', {'idempotency_key': uuid.uuid4().hex})
 # Cashier View
 @login_required
 @user_passes_test(is_cashier)
@@ -344,90 +304,36 @@ def cashier_add_sale(request):
     current_user = request.user
     company = current_user.company
     if request.method == 'POST':
-        product_ids = request.POST.getlist('product_id[]')
-        quantities = request.POST.getlist('quantity[]')
+        try:
+            sale = submit_sale(
+                company, current_user,
+                request.POST.getlist('product_id[]'), request.POST.getlist('quantity[]'),
+                request.POST.get('idempotency_key') or None,
+            )
+        except ValidationError as e:
+            messages.error(request, " | ".join(e.messages))
+            return redirect('cashier_add_sale')
 
-        if not product_ids or not quantities:
-            messages.error(request, "No products selected.")
-            return redirect('add_sale')
+        messages.success(request, f"Sale recorded successfully! Grand Total: {sale.total_price:.2f} Birr")
+        return redirect('cashier_sales')
 
-        # Convert quantities to integers
-        try:
-            quantities = [int(q) for q in quantities]
-        except (ValueError, TypeError):
-            messages.error(request, "Invalid quantity entered.")
-            return redirect('add_sale')
+    # A fresh key per rendered form: resubmitting the same form replays its sale
+    return render(request, 'cashier_page/add_sale.html', {'idempotency_key': uuid.uuid4().hex})
 
-        # Validate stock for all selected products
-        products = Product.objects.filter(id__in=product_ids, company=company)
-        product_map = {str(p.id): p for p in products}
-        stock_errors = []
-
-        for pid, qty in zip(product_ids, quantities):
-            product = product_map.get(pid)
-            if not product:
-                stock_errors.append(f"Product with ID {pid} not found.")
-            elif qty <= 0:
-                stock_errors.append(f"Quantity for {product.name} must be at least 1.")
-            elif product.total_stock < qty:
-                stock_errors.append(f"Not enough stock for {product.name}. Available: {product.total_stock}")
-
-        if stock_errors:
-            messages.error(request, " | ".join(stock_errors))
-            return redirect('add_sale')
 
-        # All validations passed, save sale
-        with transaction.atomic():
-            sale = Sale.objects.create(total_price=0, company=company)
-            grand_total = 0
-
-            for pid, qty in zip(product_ids, quantities):
-                product = product_map[pid]
-
-                # Deduct stock using FIFO
-                remaining = qty
-                batches = product.batches.filter(quantity__gt=0).order_by('added_at')
-                for batch in batches:
-                    if remaining == 0:
-                        break
-                    if batch.quantity >= remaining:
-                        batch.quantity -= remaining
-                        batch.save()
-                        remaining = 0
-                    else:
-                        remaining -= batch.quantity
-                        batch.quantity = 0
-                        batch.save()
-
-                # Compute item total
-                total_price = qty * product.selling_price
-                grand_total += total_price
-
-                # Create SaleItem
-                SaleItem.objects.create(
-                    company=company,
-                    sale=sale,
-                    product=product,
-                    quantity=qty,
-                    selling_price=product.selling_price,
-                    total_price=total_price, 
-                )
-
-            # Update Sale grand total
-            sale.total_price = grand_total
-            sale.sold_by = request.user
-
-            sale.save()
-            # Update daily summary
-            ds, created = DailySummary.objects.get_or_create(date=date.today())
-            ds.total_sales += grand_total
-            ds.total_items_sold += sum(quantities)
-            ds.save()
-
-            messages.success(request, f"Sale recorded successfully! Grand Total: {grand_total:.2f} Birr")
-            return redirect('cashier_sales')
-
-    return render(request, 'cashier_page/add_sale.html')
+@login_required(login_url='/accounts/login')
+@require_POST
+def sync_sales(request):
+    """Record a batch of sales queued by an offline till; see checkout.record_sale_batch()."""
+    try:
+        entries = parse_sale_batch(json.loads(request.body))
+    except ValueError:
+        return JsonResponse({'errors': ["The request body must be JSON."]}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'errors': e.messages}, status=400)
+
+    results = record_sale_batch(request.user.company, request.user, entries)
+    return JsonResponse({'results': results})
 
 @login_required(login_url='/accounts/login')
 @user_passes_test(is_admin)
@@ -443,47 +349,41 @@ def sales(request):
     date_to = request.GET.get('date_to', today)
     sold_by = request.GET.get('sold_by')
 
-    sale_items_qs = SaleItem.objects.select_related('product')
-
     sales = (
         Sale.objects
         .filter(company=company)  # ✅ FIXED
-        .prefetch_related(
-            Prefetch('items', queryset=sale_items_qs, to_attr='sale_items')
-        )
-        .order_by('-created_at')
+        .select_related('sold_by')
     )
 
     # FILTERS
-    if search:
-        sales = sales.filter(items__product__name__icontains=search).distinct()
-
-    if category:
-        sales = sales.filter(items__product__category_id=category).distinct()
-
-    if product_id:
-        sales = sales.filter(items__product_id=product_id).distinct()
-
-    if date_from:
-        sales = sales.filter(created_at__date__gte=date_from)
-
-    if date_to:
-        sales = sales.filter(created_at__date__lte=date_to)
-
-    if sold_by:
-        sales = sales.filter(sold_by=sold_by)
-
-    # COMPUTE PER-SALE TOTALS
-    for sale in sales:
-        sale.total_items = sum(item.quantity for item in sale.sale_items)
-        sale.total_price = sum(item.total_price for item in sale.sale_items)
-        sale.product_names = ", ".join(item.product.name for item in sale.sale_items)
-
-    grand_total_price = sum(sale.total_price for sale in sales)
-
-    paginator = Paginator(sales, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    sales = filter_sales(sales, search, category, product_id, date_from, date_to, sold_by)
+
+    # GRAND TOTAL: a date-only report reads the daily rollup, anything finer scans the sales
+    if not (search or category or product_id or sold_by):
+        summaries = DailySummary.objects.filter(company=company)
+        if date_from:
+            summaries = summaries.filter(date__gte=date_from)
+        if date_to:
+            summaries = summaries.filter(date__lte=date_to)
+        grand_total_price = summaries.aggregate(total=Sum('total_sales'))['total'] or 0
+    else:
+        grand_total_price = sales.aggregate(total=Sum('items__total_price'))['total'] or 0
+
+    # PRODUCT TOTALS for a product/category/search filter, read from the hourly rollup
+    product_totals = None
+    if (search or category or product_id) and not sold_by:
+        product_filters = {}
+        if search:
+            product_filters['product__name__icontains'] = search
+        if category:
+            product_filters['product__category_id'] = category
+        if product_id:
+            product_filters['product_id'] = product_id
+        product_totals = product_sales_summary(company, date_from, date_to, **product_filters)
+
+    # PAGINATION (keyset on created_at, id), per-sale totals computed by the same query
+    page_obj = keyset_paginate(annotate_sale_totals(sales), request, 20)
+    attach_product_names(page_obj)
 
     context = {
         'sales': page_obj,
@@ -493,9 +393,57 @@ def sales(request):
         'values': request.GET,
         'users': CustomUser.objects.filter(company=company),
         'grand_total_price': grand_total_price,
+        'product_totals': product_totals,
     }
     return render(request, 'sales.html', context)
 @login_required(login_url='/accounts/login')
+@user_passes_test(is_admin)
+def export_sales(request):
+    """Every line of the sales matching the sales page filters, as a streamed CSV."""
+    company = request.user.company
+    today = date.today()
+    date_from = request.GET.get('date_from', today)
+    date_to = request.GET.get('date_to', today)
+    sales = filter_sales(
+        Sale.objects.filter(company=company),
+        request.GET.get('search', '').strip(),
+        request.GET.get('category'),
+        request.GET.get('product'),
+        date_from,
+        date_to,
+        request.GET.get('sold_by'),
+    )
+    return csv_response(request, f"sales_{date_from or 'all'}_{date_to or 'all'}.csv", SALE_LINE_HEADER, sale_line_rows(sales))
+@login_required(login_url='/accounts/login')
+@user_passes_test(is_admin)
+def export_stock(request):
+    """Stock batches of the company (optionally one product or category), as a streamed CSV."""
+    company = request.user.company
+    batches = Stock.objects.filter(company=company)
+    search = request.GET.get('search', '').strip()
+    if search:
+        batches = batches.filter(product__name__icontains=search)
+    if request.GET.get('category'):
+        batches = batches.filter(product__category_id=request.GET['category'])
+    if request.GET.get('product'):
+        batches = batches.filter(product_id=request.GET['product'])
+    return csv_response(request, f"stock_{date.today()}.csv", STOCK_BATCH_HEADER, stock_batch_rows(batches))
+@login_required(login_url='/accounts/login')
+@user_passes_test(is_admin)
+def export_daily_summaries(request):
+    """Daily sales totals between date_from and date_to (default: all days), as a streamed CSV."""
+    company = request.user.company
+    date_from = request.GET.get('date_from')
+    date_to = request.GET.get('date_to')
+    summaries = DailySummary.objects.filter(company=company)
+    if date_from:
+        summaries = summaries.filter(date__gte=date_from)
+    if date_to:
+        summaries = summaries.filter(date__lte=date_to)
+    return csv_response(
+        request, f"daily_sales_{date_from or 'all'}_{date_to or 'all'}.csv", DAILY_SUMMARY_HEADER, daily_summary_rows(summaries)
+    )
+@login_required(login_url='/accounts/login')
 @user_passes_test(is_cashier)
 def cashier_sales(request):
     current_user = request.user
@@ -507,41 +455,18 @@ def cashier_sales(request):
     date_from = request.GET.get('date_from', today)
     date_to = request.GET.get('date_to', today)
 
-    sale_items_qs = SaleItem.objects.select_related('product')
-
     # 🔥 Filter sales ONLY for current cashier
-    sales = (
-        Sale.objects
-        .filter(sold_by=current_user)
-        .prefetch_related(Prefetch('items', queryset=sale_items_qs, to_attr='sale_items'))
-        .order_by('-created_at')
-    )
+    sales = Sale.objects.filter(sold_by=current_user)
 
     # FILTERS
-    if search:
-        sales = sales.filter(items__product__name__icontains=search).distinct()
-    if category:
-        sales = sales.filter(items__product__category_id=category).distinct()
-    if product_id:
-        sales = sales.filter(items__product_id=product_id).distinct()
-    if date_from:
-        sales = sales.filter(created_at__date__gte=date_from)
-    if date_to:
-        sales = sales.filter(created_at__date__lte=date_to)
+    sales = filter_sales(sales, search, category, product_id, date_from, date_to)
 
-    # COMPUTE PER-SALE TOTALS
-    for sale in sales:
-        sale.total_items = sum(item.quantity for item in sale.sale_items)
-        sale.total_price = sum(item.total_price for item in sale.sale_items)
-        sale.product_names = ", ".join(item.product.name for item in sale.sale_items)
+    # GRAND TOTAL (one aggregate over every matching sale)
+    grand_total_price = sales.aggregate(total=Sum('items__total_price'))['total'] or 0
 
-    # GRAND TOTAL
-    grand_total_price = sum(sale.total_price for sale in sales)
-
-    # PAGINATION
-    paginator = Paginator(sales, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # PAGINATION (keyset on created_at, id), per-sale totals computed by the same query
+    page_obj = keyset_paginate(annotate_sale_totals(sales), request, 20)
+    attach_product_names(page_obj)
 
     context = {
         'sales': page_obj,
@@ -591,17 +516,15 @@ def sale_detail(request, sale_id):
 def near_expiry_stocks(request):
     current_user = request.user
     company = current_user.company
-    threshold_date = date.today() + timedelta(days=90)
+    days = expiry_days(company.pk)[-1]
 
-    # Fetch all Stock batches expiring in the next 90 days
-    near_expiry_batches = Stock.objects.filter(
-        expiry_date__lte=threshold_date,
-        expiry_date__gte=date.today(), 
-        company=company
-    ).select_related('product').order_by('expiry_date')
+    # Batches with stock left expiring inside the company's widest window
+    near_expiry_batches = expiring_batches(company.pk, within_days=days).select_related('product').order_by('expiry_date')
 
     context = {
+        'title': f"Near Expiry Stock Batches (Next {days} Days)",
         'near_expiry_batches': near_expiry_batches,
+        'empty_message': "No stock near expiry.",
     }
     return render(request, 'near_expiry_stocks.html', context)
 @login_required(login_url='/accounts/login')
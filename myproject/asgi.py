@@ -3,11 +3,41 @@ ASGI config for myproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Deployment profile
+------------------
+The JSON endpoints in myapp/api.py (product search, barcode lookup, dashboard
+metrics, batch lists) are native async views and only pay off when the app is
+served from here, e.g.::
+
+    uvicorn myproject.asgi:application --host 0.0.0.0 --port 8000
+
+or, under a process manager::
+
+    gunicorn myproject.asgi:application -k uvicorn.workers.UvicornWorker
+
+The HTML views and checkout stay sync; Django runs each request's sync code
+(and its async ORM calls) in a thread of its own, so their DB transactions
+behave as under WSGI. Because that thread is new for every request, use the
+connection pool of the production profile (myproject/settings_production.py,
+DB_POOL_SIZE) rather than persistent per-thread connections.
+
+The CSV exports stream under both servers; under ASGI they are sent as an
+async iterator, since Django reads a sync one to the end before the first
+byte goes out.
+
+The live dashboard feed at /api/dashboard/stream/ fans events out in-process,
+so all tills and dashboards must be served by the same ASGI process (a single
+uvicorn worker) for every sale to reach every open dashboard. Under WSGI the
+feed answers 204 and the dashboard falls back to the values rendered with the
+page.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
 import os
+import pymysql
+pymysql.install_as_MySQLdb()
 
 from django.core.asgi import get_asgi_application
 
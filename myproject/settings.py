@@ -155,4 +155,49 @@ TIME_ZONE = 'Africa/Addis_Ababa'  # For Ethiopia
 AUTH_USER_MODEL = 'authentication.CustomUser'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
-LOGIN_REDIRECT_URL = '/authentication/'
\ No newline at end of file
+LOGIN_REDIRECT_URL = '/authentication/'
+# Checkout: retries of the sale transaction after a deadlock / lock wait timeout
+CHECKOUT_MAX_RETRIES = 3
+CHECKOUT_RETRY_BACKOFF = 0.05  # seconds, doubled on every attempt
+
+# Most sales an offline till may flush in one request to the sale sync endpoint
+SALE_SYNC_MAX_BATCH = 50
+# Oldest queued_at accepted from a till, in seconds; older sales are dated this far back
+SALE_SYNC_MAX_AGE = 2 * 24 * 3600
+
+# Maximum number of results returned by the product autocomplete
+PRODUCT_SEARCH_LIMIT = 20
+
+# Most products one basket revalidation may ask the stock levels endpoint about
+STOCK_LEVELS_MAX_IDS = 200
+
+# Per-company catalog snapshot used by the product autocomplete. Each process
+# keeps the snapshot in memory under a version held in the default cache; with
+# several worker processes point that cache at a shared backend (memcached/redis)
+# so a catalog write reaches all of them. The timeout bounds staleness otherwise.
+CATALOG_CACHE_TIMEOUT = 300
+
+# Seconds a till may reuse a barcode lookup before revalidating it (ETag)
+BARCODE_LOOKUP_MAX_AGE = 5
+
+# Seconds the dashboard tiles are cached per company (sale/stock writes invalidate them)
+DASHBOARD_CACHE_TIMEOUT = 60
+
+# Lifetime of one live dashboard (SSE) connection before the browser reconnects
+DASHBOARD_STREAM_SECONDS = 600
+
+# Rows fetched per query by the streamed CSV exports
+EXPORT_CHUNK_SIZE = 2000
+
+# A bulk stock delivery posts 5 fields per row; Django's default cap of 1000 fields is 200 rows
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 5000
+
+# Default (critical, warning, watch) expiry windows in days; a company's ExpiryPolicy overrides them
+EXPIRY_BUCKET_DAYS = (7, 30, 90)
+# Seconds a process may use a company's expiry windows after another process changed them
+EXPIRY_DAYS_CACHE_TIMEOUT = 60
+
+# Background worker (manage.py run_worker)
+WORKER_POLL_INTERVAL = 30  # seconds between looks for due jobs
+WORKER_JOB_LEASE = 3600  # seconds a claimed job stays locked to its worker, longer than any run
+WORKER_RETRY_DELAY = 300  # seconds before a failed job is tried again
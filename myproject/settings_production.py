@@ -0,0 +1,47 @@
+"""
+Production settings profile, selected through the environment:
+
+    DJANGO_SETTINGS_MODULE=myproject.settings_production
+
+Everything in settings.py, plus reuse of database connections across
+requests. With the default CONN_MAX_AGE=0 every request pays a TCP connect
+and a MySQL auth handshake, which costs more than the autocomplete and
+barcode queries themselves.
+
+Environment variables:
+
+    DB_CONN_MAX_AGE   seconds a connection is kept open between requests
+                      (default 600; keep it below the server's wait_timeout)
+    DB_POOL_SIZE      if set, use a process-wide connection pool of this size
+                      instead (needs the django-db-connection-pool package)
+    DB_POOL_OVERFLOW  extra connections the pool may open under load (default 10)
+    DB_POOL_RECYCLE   seconds after which pooled connections are replaced (default 3600)
+
+Persistent connections belong to the thread that opened them. That suits
+WSGI workers (Passenger, gunicorn sync/threads), but under ASGI every request
+runs its sync code in a new thread, so connections would pile up: serve
+myproject/asgi.py with DB_POOL_SIZE set. Measure the effect with
+``manage.py bench_product_search``.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES['default'].update(
+    CONN_MAX_AGE=int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+    # Ping a reused connection before the first query of a request, so one
+    # dropped by the server (wait_timeout, restart) is replaced, not an error
+    CONN_HEALTH_CHECKS=True,
+)
+
+if os.environ.get('DB_POOL_SIZE'):
+    DATABASES['default'].update(
+        ENGINE='dj_db_conn_pool.backends.mysql',
+        # Closing a pooled connection returns it to the pool
+        CONN_MAX_AGE=0,
+        POOL_OPTIONS={
+            'POOL_SIZE': int(os.environ['DB_POOL_SIZE']),
+            'MAX_OVERFLOW': int(os.environ.get('DB_POOL_OVERFLOW', 10)),
+            'RECYCLE': int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+        },
+    )